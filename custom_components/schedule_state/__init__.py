@@ -0,0 +1,58 @@
+"""The schedule_state integration"""
+
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.typing import ConfigType
+import voluptuous as vol
+
+from .const import (
+    CONF_REFRESH_JITTER,
+    CONF_STATS,
+    DEFAULT_REFRESH_JITTER,
+    DEFAULT_STATS,
+    DOMAIN,
+)
+from .coordinator import async_setup_coordinator
+from .reload import async_setup_reload
+from .sensor import async_setup_services
+from .websocket_api import async_setup_websocket
+
+# sensors are configured on the sensor platform; this optional section holds domain-wide settings
+CONFIG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(DOMAIN): vol.Schema(
+            {
+                vol.Optional(
+                    CONF_REFRESH_JITTER, default=DEFAULT_REFRESH_JITTER
+                ): cv.boolean,
+                vol.Optional(CONF_STATS, default=DEFAULT_STATS): cv.boolean,
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the domain-wide state shared by all schedule_state sensors."""
+    domain_config = config.get(DOMAIN) or {}
+    coordinator = async_setup_coordinator(hass, domain_config)
+    coordinator.hass_config = config
+    await coordinator.snapshots.async_load()
+    async_setup_websocket(hass)
+
+    # once for the domain, rather than for each sensor
+    async_setup_reload(hass)
+    await async_setup_services(hass)
+
+    if domain_config.get(CONF_STATS, DEFAULT_STATS):
+        # a diagnostic entity reporting performance metrics for all sensors
+        hass.async_create_task(
+            async_load_platform(
+                hass, Platform.SENSOR, DOMAIN, {CONF_STATS: True}, config
+            )
+        )
+
+    return True
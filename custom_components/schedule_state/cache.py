@@ -0,0 +1,318 @@
+"""Caches shared by all schedule_state sensors."""
+
+from collections.abc import Callable
+from datetime import date, datetime, time
+import json
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant, valid_entity_id
+from homeassistant.exceptions import (
+    ConditionError,
+    ConditionErrorContainer,
+    ConditionErrorIndex,
+    HomeAssistantError,
+)
+from homeassistant.helpers import condition
+from homeassistant.helpers.template import RenderInfo, Template
+from homeassistant.helpers.trace import trace_path
+from homeassistant.util import dt
+
+_LOGGER = logging.getLogger(__name__)
+
+# time conditions that only look at the weekday can be memoized for the rest of the day
+_DATE_ONLY_TIME_KEYS = {"condition", "weekday", "alias", "enabled"}
+
+
+def _normalize(item: Any) -> Any:
+    """Convert a condition config to something that can be used as a dict key"""
+    if isinstance(item, Template):
+        return {"__template__": item.template}
+    if isinstance(item, (time, datetime, date)):
+        return item.isoformat()
+    if isinstance(item, dict):
+        return {str(k): _normalize(v) for k, v in item.items()}
+    if isinstance(item, (list, tuple, set)):
+        return [_normalize(v) for v in item]
+    if isinstance(item, (str, int, float, bool, type(None))):
+        return item
+    return str(item)
+
+
+def condition_key(config: Any) -> str:
+    """Normalized representation of a condition config"""
+    return json.dumps(_normalize(config), sort_keys=True)
+
+
+def _collect_entity_ids(item: Any, found: set[str]) -> None:
+    """Find anything that looks like an entity id in a condition config"""
+    if isinstance(item, str):
+        if valid_entity_id(item):
+            found.add(item)
+    elif isinstance(item, dict):
+        for v in item.values():
+            _collect_entity_ids(v, found)
+    elif isinstance(item, (list, tuple, set)):
+        for v in item:
+            _collect_entity_ids(v, found)
+
+
+def _memo_kind(config: Any) -> str | None:
+    """Can the result of this condition be reused until its entities change?
+
+    Returns "state" if the result only depends on the state of entities, "date" if it
+    also depends on the current date, and None if it cannot be memoized at all
+    (time of day, sun, templates...).
+    """
+    if not isinstance(config, dict):
+        return None
+    if isinstance(config.get("enabled", True), Template):
+        return None
+
+    cond_type = config.get("condition")
+    if cond_type == "state":
+        return None if "for" in config else "state"
+    if cond_type == "numeric_state":
+        return None if "value_template" in config else "state"
+    if cond_type == "time":
+        return "date" if set(config) <= _DATE_ONLY_TIME_KEYS else None
+    if cond_type in ("and", "or", "not"):
+        kinds = [_memo_kind(c) for c in config.get("conditions", [])]
+        if None in kinds:
+            return None
+        return "date" if "date" in kinds else "state"
+    return None
+
+
+class CompiledCondition:
+    """A condition compiled once, and shared by every sensor that uses it"""
+
+    def __init__(self, check: Callable, configs: list):
+        self.check = check
+        self.configs = configs
+
+        # entities reported to the sensors, so that they can be tracked
+        self.entities: set[str] = set()
+        for conf in configs:
+            self.entities.update(condition.async_extract_entities(conf))
+
+        kinds = [_memo_kind(conf) for conf in configs]
+        self.memoizable = None not in kinds
+        self.date_dependent = "date" in kinds
+
+        # everything that might affect the result: also entities used as thresholds etc.
+        dependencies = set(self.entities)
+        _collect_entity_ids(configs, dependencies)
+        self.dependencies = tuple(sorted(dependencies))
+
+        self._memo_key = None
+        self._memo_result = None
+
+    def evaluate(
+        self, hass: HomeAssistant, cache: "ConditionCache", name: str
+    ) -> bool | None:
+        """Evaluate the condition, reusing the last result if nothing it depends on has changed"""
+        if not self.memoizable:
+            cache.evaluations += 1
+            return self.check({}, name)
+
+        # State objects are replaced whenever an entity changes, so they act as a generation
+        key = (
+            dt.now().date() if self.date_dependent else None,
+            tuple(hass.states.get(e) for e in self.dependencies),
+        )
+        if self._memo_key is not None and key == self._memo_key:
+            cache.hits += 1
+            return self._memo_result
+
+        cache.evaluations += 1
+        result = self.check({}, name)
+        if result is None:
+            # errors are not memoized - try again next time
+            self._memo_key = None
+        else:
+            self._memo_key = key
+            self._memo_result = result
+        return result
+
+
+class ConditionCache:
+    """Compiled conditions, keyed by their normalized configuration"""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._compiled: dict[str, CompiledCondition] = {}
+        # names of the sensors that use each compiled condition, see forget
+        self._users: dict[str, set[str]] = {}
+        self.hits = 0
+        self.evaluations = 0
+
+    def __len__(self) -> int:
+        return len(self._compiled)
+
+    async def async_get(
+        self, name: str, configs: list, key: str | None = None
+    ) -> CompiledCondition | None:
+        """Return the compiled version of a list of condition configs (key: see condition_key)"""
+        if key is None:
+            key = condition_key(configs)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            check = await _async_process_if(self.hass, name, configs)
+            if check is None:
+                return None
+            compiled = CompiledCondition(check, configs)
+            self._compiled[key] = compiled
+            self._users[key] = set()
+        self._users[key].add(name)
+        return compiled
+
+    def forget(self, name: str) -> None:
+        """Forget the compiled conditions that only the given sensor used (when reloading it)"""
+        for key, users in list(self._users.items()):
+            users.discard(name)
+            if not users:
+                del self._users[key]
+                del self._compiled[key]
+
+
+class RenderedTemplate:
+    """The result of rendering a template, and what it depends on"""
+
+    __slots__ = ("result", "entities", "cacheable", "_states", "_derived")
+
+    def __init__(self, hass: HomeAssistant, result: Any, info: RenderInfo):
+        self.result = result
+        self.entities = frozenset(info.entities)
+        # templates that look at the time, or at whole domains, must always be rendered
+        self.cacheable = info.is_static or not (
+            info.has_time
+            or info.all_states
+            or info.all_states_lifecycle
+            or info.domains
+            or info.domains_lifecycle
+        )
+        self._states = tuple(hass.states.get(e) for e in self.entities)
+        self._derived: dict[str, tuple[Any, Any]] = {}
+
+    def is_current(self, hass: HomeAssistant) -> bool:
+        """Have any of the entities used by the template changed since it was rendered?"""
+        # State objects are replaced whenever an entity changes, so they act as a generation
+        return all(
+            hass.states.get(e) is state for e, state in zip(self.entities, self._states)
+        )
+
+
+class TemplateCache:
+    """Rendered templates, keyed by their source text.
+
+    Many sensors share identical templates (e.g. for sunrise/sunset). Each distinct template
+    is rendered once, and re-rendered only when one of the entities that it used changes.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._rendered: dict[str, RenderedTemplate] = {}
+        # entities read by the last rendering of each template, even if it failed
+        self._entities: dict[str, frozenset[str]] = {}
+        # names of the sensors that use each template, see forget
+        self._users: dict[str, set[str]] = {}
+        self.hits = 0
+        self.renders = 0
+
+    def __len__(self) -> int:
+        return len(self._rendered)
+
+    def async_render(self, template: Template, name: str) -> RenderedTemplate:
+        """Render a template for a sensor, or return the previous result if it is still valid.
+
+        Raises the same exceptions as rendering the template directly.
+        """
+        source = template.template
+        self._users.setdefault(source, set()).add(name)
+        rendered = self._rendered.get(source)
+        if rendered is not None and rendered.is_current(self.hass):
+            self.hits += 1
+            return rendered
+
+        self.renders += 1
+        template.hass = self.hass
+        info = template.async_render_to_info(None, parse_result=False)
+        self._entities[source] = frozenset(info.entities)
+        rendered = RenderedTemplate(self.hass, info.result(), info)
+        if rendered.cacheable:
+            self._rendered[source] = rendered
+        else:
+            self._rendered.pop(source, None)
+        return rendered
+
+    def derive(
+        self, template: Template, result: Any, kind: str, fn: Callable[[Any], Any]
+    ) -> Any:
+        """Return fn(result), sharing the value with all users of the same rendered template"""
+        rendered = self._rendered.get(template.template)
+        if rendered is None or rendered.result is not result:
+            return fn(result)
+
+        # parsing can depend on the date (e.g. daylight saving time)
+        key = dt.now().date()
+        derived = rendered._derived.get(kind)
+        if derived is not None and derived[0] == key:
+            return derived[1]
+
+        value = fn(result)
+        rendered._derived[kind] = (key, value)
+        return value
+
+    def entities(self, template: Template) -> frozenset[str]:
+        """The entities read by the last rendering of a template (also if it failed)"""
+        return self._entities.get(template.template, frozenset())
+
+    def forget(self, name: str) -> None:
+        """Forget the templates that only the given sensor used (when reloading it)"""
+        for source, users in list(self._users.items()):
+            users.discard(name)
+            if not users:
+                del self._users[source]
+                self._rendered.pop(source, None)
+                self._entities.pop(source, None)
+
+
+async def _async_process_if(hass, name, if_configs):
+    """Process if checks."""
+    checks = []
+    for if_config in if_configs:
+        try:
+            checks.append(await condition.async_from_config(hass, if_config))
+        except HomeAssistantError as ex:
+            _LOGGER.warning("Invalid condition: %s", ex)
+            return None
+
+    def if_action(variables=None, sensor_name=name):
+        """AND all conditions."""
+        errors = []
+        for index, check in enumerate(checks):
+            try:
+                with trace_path(["condition", str(index)]):
+                    if not check(hass, variables):
+                        return False
+            except ConditionError as ex:
+                errors.append(
+                    ConditionErrorIndex(
+                        "condition", index=index, total=len(checks), error=ex
+                    )
+                )
+
+        if errors:
+            _LOGGER.warning(
+                "Error evaluating condition in '%s':\n%s",
+                sensor_name,
+                ConditionErrorContainer("condition", errors=errors),
+            )
+            return None
+
+        return True
+
+    if_action.config = if_configs
+
+    return if_action
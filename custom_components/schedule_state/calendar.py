@@ -0,0 +1,64 @@
+"""Calendar entities showing the schedule of schedule_state sensors."""
+
+from datetime import datetime, timedelta
+import hashlib
+
+from homeassistant.components.calendar import CalendarEntity, CalendarEvent
+from homeassistant.const import CONF_NAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.util import dt
+
+from .coordinator import get_coordinator
+from .timeline import Period
+
+# how far ahead to look for the next event
+UPCOMING = timedelta(days=7)
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType = None,
+) -> None:
+    """Set up the calendar of a schedule sensor (discovered by the sensor platform)."""
+    if discovery_info is None:
+        return
+
+    data = get_coordinator(hass).schedules.get(discovery_info[CONF_NAME])
+    if data is not None:
+        async_add_entities([ScheduleCalendar(data)], True)
+
+
+def _calendar_event(period: Period) -> CalendarEvent:
+    return CalendarEvent(start=period.start, end=period.end, summary=str(period.state))
+
+
+class ScheduleCalendar(CalendarEntity):
+    """The states of a schedule (other than the default state), as calendar events."""
+
+    def __init__(self, data):
+        self.data = data
+        self._event: CalendarEvent | None = None
+        self._attr_name = data.name
+
+        unique_id = hashlib.sha3_512(data.name.encode("utf-8")).hexdigest()
+        self._attr_unique_id = f"{unique_id}_calendar"
+
+    @property
+    def event(self) -> CalendarEvent | None:
+        """The current or next event"""
+        return self._event
+
+    async def async_update(self) -> None:
+        now = dt.as_local(dt.now())
+        periods = await self.data.async_get_periods(now, now + UPCOMING)
+        self._event = _calendar_event(periods[0]) if periods else None
+
+    async def async_get_events(
+        self, hass: HomeAssistant, start_date: datetime, end_date: datetime
+    ) -> list[CalendarEvent]:
+        periods = await self.data.async_get_periods(start_date, end_date)
+        return [_calendar_event(p) for p in periods]
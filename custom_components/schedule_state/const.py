@@ -9,6 +9,13 @@ DEFAULT_STATE = "default"
 DEFAULT_ICON = "mdi:calendar-check"
 DEFAULT_ERROR_ICON = "mdi:calendar-alert"
 
+MAX_FORECAST_HOURS = 31 * 24
+MAX_SAMPLES = 20000
+
+# sent (with the name of the sensor appended) when the layer structure of a schedule changes
+SIGNAL_STRUCTURE_UPDATED = f"{DOMAIN}_structure_updated"
+EVENT_RELOADED = f"event_{DOMAIN}_reloaded"
+
 CONF_EVENTS = "events"
 CONF_START = "start"
 CONF_START_OFFSET = "start_offset"
@@ -22,3 +29,19 @@ CONF_ERROR_ICON = "error_icon"
 CONF_MINUTES_TO_REFRESH_ON_ERROR = "minutes_to_refresh_on_error"
 CONF_EXTRA_ATTRIBUTES = "extra_attributes"
 CONF_ALLOW_WRAP = "allow_wrap"
+CONF_CALENDAR = "calendar"
+CONF_STRUCTURE_ATTRIBUTES = "structure_attributes"
+CONF_LAYERS_FORMAT = "layers_format"
+CONF_OCCLUSION_CULLING = "occlusion_culling"
+CONF_HOURS = "hours"
+CONF_ITERATIONS = "iterations"
+CONF_MEMORY = "memory"
+CONF_STEP = "step"
+CONF_TIMES = "times"
+
+# domain-wide settings (`schedule_state:` in configuration.yaml)
+CONF_REFRESH_JITTER = "refresh_jitter"
+CONF_STATS = "stats"
+
+DEFAULT_REFRESH_JITTER = True
+DEFAULT_STATS = False
@@ -0,0 +1,407 @@
+"""Domain-wide coordination shared by all schedule_state sensors."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from datetime import datetime, timedelta
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+from typing import Any
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+)
+from homeassistant.util import dt
+
+from .cache import ConditionCache, TemplateCache
+from .const import CONF_REFRESH_JITTER, DEFAULT_REFRESH_JITTER, DOMAIN
+from .snapshot import SnapshotStore
+
+_LOGGER = logging.getLogger(__name__)
+
+# number of sensors whose first schedule is computed together, see InitialComputeQueue
+INITIAL_BATCH_SIZE = 10
+
+# seconds between two transitions of the same sensor, see TransitionScheduler
+MIN_INTERVAL = 1
+
+
+class RefreshCoordinator:
+    """Spread the periodic refreshes of all sensors across the refresh period.
+
+    Without coordination, every sensor refreshes `refresh` after it was set up, and since
+    all sensors are set up at (nearly) the same time, they all recompute in the same poll
+    cycle. Instead, each sensor is given a deterministic phase within its refresh period,
+    derived from its name, so refreshes are spread evenly and stay stable across restarts.
+    """
+
+    def __init__(self, jitter: bool):
+        self.jitter = jitter
+
+    @staticmethod
+    def phase(name: str, period: timedelta) -> float:
+        """Deterministic offset (in seconds) of a sensor within its refresh period"""
+        seconds = period.total_seconds()
+        if seconds <= 0:
+            return 0.0
+        digest = hashlib.sha1(str(name).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % int(seconds)
+
+    def next_refresh(self, name: str, period: timedelta, last: datetime) -> datetime:
+        """When should a sensor that was last refreshed at `last` be refreshed again?"""
+        seconds = period.total_seconds()
+        if not self.jitter or seconds <= 0:
+            return last + period
+
+        # refreshes happen at phase + k * period (seconds since the epoch)
+        phase = self.phase(name, period)
+        ts = last.timestamp()
+        k = math.floor((ts - phase) / seconds) + 1
+        return last + timedelta(seconds=phase + k * seconds - ts)
+
+
+class EntityChangeDispatcher:
+    """Receive each state change once and fan it out to the sensors that depend on it.
+
+    Popular entities (workday sensors, vacation toggles...) are referenced by many schedules.
+    Rather than each sensor subscribing to them, there is a single subscription per entity
+    and an inverted index from entity to listeners. Changes that arrive in the same event
+    loop iteration are coalesced, so each affected listener is called only once.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        # entity_id -> keys of the listeners that depend on it
+        self._index: dict[str, set[Hashable]] = {}
+        # key -> (entities, action)
+        self._listeners: dict[Hashable, tuple[frozenset[str], Callable]] = {}
+        # entity_id -> unsubscribe callback
+        self._unsubs: dict[str, CALLBACK_TYPE] = {}
+        # key -> entity_ids that changed since the last flush
+        self._pending: dict[Hashable, set[str]] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    def entities(self, key: Hashable) -> frozenset[str]:
+        """The entities that are currently tracked for a listener"""
+        listener = self._listeners.get(key)
+        return listener[0] if listener is not None else frozenset()
+
+    @callback
+    def async_track(
+        self,
+        key: Hashable,
+        entities: Iterable[str],
+        action: Callable[[set[str]], Awaitable[None]],
+    ) -> None:
+        """Call `action` when any of `entities` changes, replacing any previous registration for `key`"""
+        entities = frozenset(entities)
+        old_entities, _ = self._listeners.get(key, (frozenset(), None))
+        self._listeners[key] = (entities, action)
+
+        if entities == old_entities:
+            return
+
+        for entity_id in old_entities - entities:
+            self._remove_from_index(key, entity_id)
+        for entity_id in entities - old_entities:
+            self._add_to_index(key, entity_id)
+
+        _LOGGER.debug("%s: tracking changes to %s", key, sorted(entities))
+
+    @callback
+    def async_untrack(self, key: Hashable) -> None:
+        """Stop calling the action registered for `key`"""
+        entities, _ = self._listeners.pop(key, (frozenset(), None))
+        for entity_id in entities:
+            self._remove_from_index(key, entity_id)
+        self._pending.pop(key, None)
+
+    def _add_to_index(self, key: Hashable, entity_id: str) -> None:
+        keys = self._index.setdefault(entity_id, set())
+        keys.add(key)
+        if entity_id not in self._unsubs:
+            self._unsubs[entity_id] = async_track_state_change_event(
+                self.hass, entity_id, self._async_state_changed
+            )
+
+    def _remove_from_index(self, key: Hashable, entity_id: str) -> None:
+        keys = self._index.get(entity_id)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._index[entity_id]
+            if (unsub := self._unsubs.pop(entity_id, None)) is not None:
+                unsub()
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        entity_id = event.data["entity_id"]
+        for key in self._index.get(entity_id, ()):
+            self._pending.setdefault(key, set()).add(entity_id)
+
+        if self._pending and self._flush_task is None:
+            self._flush_task = self.hass.async_create_task(
+                self._async_flush(), "schedule_state dispatcher"
+            )
+
+    async def _async_flush(self) -> None:
+        # let other changes from the same event loop iteration accumulate
+        await asyncio.sleep(0)
+
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+
+        for key, entity_ids in pending.items():
+            listener = self._listeners.get(key)
+            if listener is None:
+                continue
+            try:
+                await listener[1](entity_ids)
+            except Exception:  # noqa: BLE001
+                _LOGGER.exception(f"{key}: error handling changes to {entity_ids}")
+
+
+class TransitionScheduler:
+    """Fire the transitions of all sensors from a single timer.
+
+    Each sensor registers the next time at which its state (or icon, or attributes) changes.
+    The times are kept in a priority queue, and only one loop timer is armed, for the
+    earliest of them. When it fires, every sensor due at that instant is updated, and then
+    their states are written together.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        # (timestamp, sequence, key) - entries that no longer match _due are stale
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._due: dict[Hashable, float] = {}
+        self._actions: dict[
+            Hashable, tuple[Callable[[], Awaitable[None]], Callable[[], None]]
+        ] = {}
+        self._last_fired: dict[Hashable, float] = {}
+        self._seq = itertools.count()
+        self._timer_at: float | None = None
+        self._unsub_timer: CALLBACK_TYPE | None = None
+        self._shutdown = False
+
+    def next_transition(self, key: Hashable) -> datetime | None:
+        """When the transition for a sensor is scheduled"""
+        if (ts := self._due.get(key)) is None:
+            return None
+        return dt.utc_from_timestamp(ts)
+
+    @callback
+    def async_schedule(
+        self,
+        key: Hashable,
+        when: datetime,
+        update: Callable[[], Awaitable[None]],
+        write: Callable[[], None],
+    ) -> None:
+        """Call `update` and then `write` for `key` at `when`, replacing any previous schedule"""
+        # never fire twice for the same instant: a transition that is not after the last
+        # one is moved just after it, so that the sensor keeps being updated
+        ts = max(when.timestamp(), self._last_fired.get(key, -math.inf) + MIN_INTERVAL)
+        self._actions[key] = (update, write)
+        if self._due.get(key) == ts:
+            return
+
+        self._due[key] = ts
+        heapq.heappush(self._heap, (ts, next(self._seq), key))
+        self._async_arm()
+
+    @callback
+    def async_unschedule(self, key: Hashable) -> None:
+        """Forget about a sensor"""
+        self._due.pop(key, None)
+        self._actions.pop(key, None)
+        self._last_fired.pop(key, None)
+
+    @callback
+    def async_shutdown(self, *args) -> None:
+        """Cancel the timer"""
+        self._shutdown = True
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._timer_at = None
+
+    def _prune(self) -> None:
+        # drop stale entries from the top of the queue
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    @callback
+    def _async_arm(self) -> None:
+        self._prune()
+        if self._shutdown or not self._heap:
+            return
+
+        ts = self._heap[0][0]
+        if ts == self._timer_at:
+            return
+
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+        self._timer_at = ts
+        self._unsub_timer = async_track_point_in_utc_time(
+            self.hass, self._async_fire, dt.utc_from_timestamp(ts)
+        )
+
+    @callback
+    def _async_fire(self, _now: datetime) -> None:
+        fired_at = self._timer_at
+        self._unsub_timer = None
+        self._timer_at = None
+        if fired_at is None:
+            return
+
+        # collect every sensor that is due at (or before) this instant
+        due = []
+        self._prune()
+        while self._heap and self._heap[0][0] <= fired_at:
+            ts, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) != ts:
+                continue
+            del self._due[key]
+            self._last_fired[key] = ts
+            due.append(key)
+
+        if due:
+            self.hass.async_create_task(
+                self._async_run_batch(due), "schedule_state transitions"
+            )
+        self._async_arm()
+
+    async def _async_run_batch(self, keys: list[Hashable]) -> None:
+        updated = []
+        for key in keys:
+            if (actions := self._actions.get(key)) is None:
+                continue
+            try:
+                await actions[0]()
+            except Exception:  # noqa: BLE001
+                _LOGGER.exception(f"{key}: error updating schedule")
+                continue
+            updated.append(key)
+
+        # write all the new states together
+        for key in updated:
+            if (actions := self._actions.get(key)) is not None:
+                actions[1]()
+
+
+class InitialComputeQueue:
+    """Compute the first schedule of sensors after they have been added, a batch at a time.
+
+    Computing every schedule while the platform is being set up delays the startup of Home
+    Assistant, and the registration of the other entities. Instead, sensors are added right
+    away, and queued here. Each batch is computed concurrently, their states are written
+    together, and the event loop gets a chance to run other work before the next batch.
+    """
+
+    def __init__(self, hass: HomeAssistant, batch_size: int):
+        self.hass = hass
+        self.batch_size = batch_size
+        self._pending: dict[
+            Hashable, tuple[Callable[[], Awaitable[None]], Callable[[], None]]
+        ] = {}
+        # the keys of the batch being computed, until they are removed
+        self._in_flight: set[Hashable] = set()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @callback
+    def async_add(
+        self,
+        key: Hashable,
+        update: Callable[[], Awaitable[None]],
+        write: Callable[[], None],
+    ) -> None:
+        """Call `update` and then `write` for `key` in one of the next batches"""
+        self._pending[key] = (update, write)
+        if self._task is None:
+            self._task = self.hass.async_create_task(
+                self._async_run(), "schedule_state initial computes"
+            )
+
+    @callback
+    def async_remove(self, key: Hashable) -> None:
+        """Forget about a sensor that has not been computed yet (or is being computed)"""
+        self._pending.pop(key, None)
+        self._in_flight.discard(key)
+
+    async def _async_run(self) -> None:
+        try:
+            # let the sensors of the same platform setup be queued first
+            await asyncio.sleep(0)
+            while self._pending:
+                keys = list(itertools.islice(self._pending, self.batch_size))
+                batch = [(key, self._pending.pop(key)) for key in keys]
+                self._in_flight = set(keys)
+                results = await asyncio.gather(
+                    *(actions[0]() for _, actions in batch), return_exceptions=True
+                )
+                for (key, actions), result in zip(batch, results):
+                    if key not in self._in_flight:
+                        # removed while its schedule was being computed
+                        continue
+                    if isinstance(result, Exception):
+                        _LOGGER.error(f"{key}: error computing schedule: {result}")
+                    else:
+                        actions[1]()
+                await asyncio.sleep(0)
+        finally:
+            self._in_flight = set()
+            self._task = None
+
+
+class ScheduleStateCoordinator:
+    """Holds the state shared by all schedule_state sensors (stored in hass.data)."""
+
+    def __init__(self, hass: HomeAssistant, config: dict):
+        self.hass = hass
+        self.refresh = RefreshCoordinator(
+            config.get(CONF_REFRESH_JITTER, DEFAULT_REFRESH_JITTER)
+        )
+        self.dispatcher = EntityChangeDispatcher(hass)
+        self.conditions = ConditionCache(hass)
+        self.templates = TemplateCache(hass)
+        self.scheduler = TransitionScheduler(hass)
+        self.initial = InitialComputeQueue(hass, INITIAL_BATCH_SIZE)
+        # schedules saved for the next startup, see snapshot.py
+        self.snapshots = SnapshotStore(hass)
+        # schedule data by sensor name, for the other platforms
+        self.schedules: dict[str, Any] = {}
+        # the whole Home Assistant configuration, for loading other platforms
+        self.hass_config: dict = {}
+
+        hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self.scheduler.async_shutdown
+        )
+
+
+def async_setup_coordinator(
+    hass: HomeAssistant, config: dict | None = None
+) -> ScheduleStateCoordinator:
+    """Create the domain coordinator, using the `schedule_state:` configuration"""
+    coordinator = ScheduleStateCoordinator(hass, config or {})
+    hass.data[DOMAIN] = coordinator
+    return coordinator
+
+
+def get_coordinator(hass: HomeAssistant) -> ScheduleStateCoordinator:
+    """Return the domain coordinator, creating it with default settings if needed"""
+    coordinator = hass.data.get(DOMAIN)
+    if coordinator is None:
+        _LOGGER.debug("creating domain coordinator with default settings")
+        coordinator = async_setup_coordinator(hass)
+    return coordinator
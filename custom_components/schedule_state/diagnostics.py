@@ -0,0 +1,88 @@
+"""Diagnostics for schedule_state sensors."""
+
+from datetime import date, datetime, time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+import portion as P
+
+from .coordinator import get_coordinator
+
+
+def _jsonable(value: Any) -> Any:
+    """Convert times, sets etc to something that can be sent as JSON"""
+    if isinstance(value, (time, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    return str(value)
+
+
+def _timeline(intervals: P.IntervalDict) -> list[dict]:
+    """The compiled intervals of a schedule, in order"""
+    timeline = [
+        {"start": i.lower, "end": i.upper, "value": v}
+        for k, v in intervals.items()
+        for i in k
+    ]
+    timeline.sort(key=lambda item: item["start"])
+    return _jsonable(timeline)
+
+
+def cache_statistics(coordinator) -> dict[str, Any]:
+    """Size and effectiveness of the caches shared by all sensors"""
+    return {
+        "condition_cache": {
+            "size": len(coordinator.conditions),
+            "hits": coordinator.conditions.hits,
+            "evaluations": coordinator.conditions.evaluations,
+        },
+        "template_cache": {
+            "size": len(coordinator.templates),
+            "hits": coordinator.templates.hits,
+            "renders": coordinator.templates.renders,
+        },
+    }
+
+
+def sensor_diagnostics(sensor) -> dict[str, Any]:
+    """Everything that is known about how the schedule of a sensor was computed"""
+    data = sensor.data
+    coordinator = data.coordinator
+    return {
+        "name": data.name,
+        "state": sensor.native_value,
+        "timeline": {
+            "states": _timeline(data._states),
+            "icons": _timeline(data._icons),
+            "attributes": {k: _timeline(v) for k, v in data._custom_attributes.items()},
+        },
+        "transitions": [f"{m // 60:02d}:{m % 60:02d}" for m in data._transitions],
+        "next_transition": _jsonable(data.next_transition),
+        "next_refresh": _jsonable(data._next_refresh_time),
+        "force_refresh": _jsonable(data.force_refresh),
+        "dependencies": sorted(data.entities),
+        "tracked_entities": sorted(coordinator.dispatcher.entities(sensor)),
+        "errors": sorted(data.error_states),
+        "overrides": _jsonable(data.overrides),
+        "metrics": data.metrics.as_dict(),
+        "traces": [t.as_dict() for t in data.traces],
+        "tracing": data.log.enabled,
+        "messages": data.log.messages(),
+    }
+
+
+def async_get_diagnostics(hass: HomeAssistant, sensors: list) -> dict[str, Any]:
+    """Diagnostics for the given sensors, and for the state they share"""
+    coordinator = get_coordinator(hass)
+    return {
+        "coordinator": {
+            "refresh_jitter": coordinator.refresh.jitter,
+            **cache_statistics(coordinator),
+        },
+        "sensors": {s.entity_id: sensor_diagnostics(s) for s in sensors},
+    }
@@ -0,0 +1,129 @@
+"""Events and overrides, compiled once from the configuration."""
+
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from homeassistant.helpers.template import Template
+import portion as P
+
+from .cache import condition_key
+from .timeline import month_numbers
+
+
+def static_value(value: Any) -> Any:
+    """A template without any code is a constant: its text, which never needs rendering"""
+    if isinstance(value, Template) and value.is_static:
+        return value.template
+    return value
+
+
+def has_enabled_template(conditions: list) -> bool:
+    """Whether any condition (including nested ones) is enabled by a template"""
+    for cond in conditions:
+        if not isinstance(cond, dict):
+            continue
+        if isinstance(cond.get("enabled"), Template):
+            return True
+        if has_enabled_template(cond.get("conditions") or []):
+            return True
+    return False
+
+
+class CompiledEvent:
+    """What is known about an event (or override) without evaluating it.
+
+    The values that are used for every recompute (state, start, end, offsets, icon and extra
+    attributes) are either constants or templates, and None if not configured. Templates
+    without any code are constants. allow_wrap is
+    None if the event uses the setting of the sensor. display_icon is the icon shown in the
+    layers attribute. condition_handle is the key of the condition in the ConditionCache.
+
+    layer_key groups consecutive events with the same conditions in the layers attribute.
+    condition_text is None when it depends on templates, and must be formatted again for
+    each recompute.
+    """
+
+    __slots__ = (
+        "event",
+        "is_override",
+        "state",
+        "start",
+        "end",
+        "start_offset",
+        "end_offset",
+        "icon",
+        "display_icon",
+        "attributes",
+        "allow_wrap",
+        "expires",
+        "condition",
+        "condition_handle",
+        "conditions",
+        "weekdays",
+        "months",
+        "layer_key",
+        "condition_text",
+        "raw_conditions",
+        "raw_state_template",
+        "serialized",
+    )
+
+    def __init__(
+        self,
+        event: dict[str, Any],
+        *,
+        is_override: bool,
+        display_icon: str | None,
+        attributes: dict[str, Any],
+        conditions: list,
+        weekdays: list[str],
+        layer_key: str,
+        condition_text: str | None,
+        raw_conditions: list,
+        raw_state_template: str,
+        serialized: dict[str, Any],
+    ):
+        self.event = event
+        self.is_override = is_override
+        self.state: Template | Any = static_value(event.get("state"))
+        self.start: Template | Any = static_value(event.get("start"))
+        self.end: Template | Any = static_value(event.get("end"))
+        self.start_offset: Template | Any = static_value(event.get("start_offset"))
+        self.end_offset: Template | Any = static_value(event.get("end_offset"))
+        self.icon: str | None = static_value(event.get("icon"))
+        self.display_icon = display_icon
+        self.attributes = {k: static_value(v) for k, v in attributes.items()}
+        self.allow_wrap: bool | None = event.get("allow_wrap")
+        self.expires: datetime | None = event["expires"] if is_override else None
+        self.condition = event.get("condition")
+        self.condition_handle = (
+            None if self.condition is None else condition_key(self.condition)
+        )
+        self.conditions = conditions
+        self.weekdays = weekdays
+        # None if the event applies in every month
+        self.months = month_numbers(event.get("months") or event.get("month"))
+        self.layer_key = layer_key
+        self.condition_text = condition_text
+        self.raw_conditions = raw_conditions
+        self.raw_state_template = raw_state_template
+        self.serialized = serialized
+
+
+class EventOutcome(NamedTuple):
+    """The result of evaluating an event, which is reused until the event is evaluated again.
+
+    intervals is None if the event does not apply (its condition is not satisfied, or there
+    was an error).
+    """
+
+    state: Any
+    intervals: P.Interval | None
+    error: bool = False
+
+
+class EventFailure(NamedTuple):
+    """An event that could not be evaluated, and when to try it again"""
+
+    failures: int
+    retry_at: datetime
@@ -0,0 +1,137 @@
+"""Compact (columnar) encoding of the layer structure of a schedule.
+
+The verbose format repeats every field of a block (conditions, templates, icons...) for every
+day and for both halves of a wrapped event. The compact format stores each distinct value once
+in a lookup table, each distinct block once as an array of indices, and each day as lists of
+block indices:
+
+    {
+        "format": 2,
+        "tables": {"states": [...], "templates": [...], "conditions": [...],
+                   "condition_texts": [...], "icons": [...]},
+        "blocks": [[event_idx, start, end, original_start, original_end, flags,
+                    state, template, conditions, condition_text, icon], ...],
+        "days": {"mon": [[condition_key, condition_text, [block, ...]], ...], ...},
+    }
+
+Times are minutes since midnight (the end of the day is 1440). The last layer of every day
+is the default layer.
+"""
+
+import json
+from typing import Any
+
+LAYERS_FORMAT_VERBOSE = 1
+LAYERS_FORMAT_COMPACT = 2
+LAYERS_FORMATS = (LAYERS_FORMAT_VERBOSE, LAYERS_FORMAT_COMPACT)
+
+# columns of a compact block
+BLOCK_COLUMNS = (
+    "event_idx",
+    "start",
+    "end",
+    "original_start",
+    "original_end",
+    "flags",
+    "state_value",
+    "raw_state_template",
+    "raw_conditions",
+    "condition_text",
+    "icon",
+)
+
+# bits of the "flags" column
+FLAG_WRAPS_START = 1
+FLAG_WRAPS_END = 2
+FLAG_DEFAULT_BG = 4
+FLAG_DYNAMIC_COLOR = 8
+
+_FLAGS = (
+    ("wraps_start", FLAG_WRAPS_START),
+    ("wraps_end", FLAG_WRAPS_END),
+    ("is_default_bg", FLAG_DEFAULT_BG),
+    ("is_dynamic_color", FLAG_DYNAMIC_COLOR),
+)
+
+_TABLES = {
+    "state_value": "states",
+    "raw_state_template": "templates",
+    "raw_conditions": "conditions",
+    "condition_text": "condition_texts",
+    "icon": "icons",
+}
+
+
+def _minutes(hhmm: str, end: bool = False) -> int:
+    hours, minutes = hhmm.split(":")
+    m = int(hours) * 60 + int(minutes)
+    return 1440 if end and m == 0 else m
+
+
+class _Table:
+    """Distinct values, in order of first use"""
+
+    __slots__ = ("values", "_index")
+
+    def __init__(self):
+        self.values: list = []
+        self._index: dict[tuple, int] = {}
+
+    def add(self, value: Any) -> int:
+        # "21" and 21 are different values
+        if isinstance(value, str):
+            key = (True, value)
+        else:
+            key = (False, json.dumps(value, sort_keys=True, default=str))
+        idx = self._index.get(key)
+        if idx is None:
+            idx = self._index[key] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def compact_layers(layers_by_day: dict[str, list[dict]]) -> dict[str, Any]:
+    """Encode the verbose layer structure in the compact format"""
+    tables = {name: _Table() for name in _TABLES.values()}
+    blocks: list[list] = []
+    block_index: dict[tuple, int] = {}
+    days: dict[str, list] = {}
+
+    for day, layers in layers_by_day.items():
+        day_layers = []
+        for layer in layers:
+            indices = []
+            for block in layer["blocks"]:
+                flags = 0
+                for key, bit in _FLAGS:
+                    if block.get(key):
+                        flags |= bit
+                row = (
+                    block.get("event_idx"),
+                    _minutes(block["start"]),
+                    _minutes(block["end"], end=True),
+                    _minutes(block["original_start"]),
+                    _minutes(block["original_end"], end=True),
+                    flags,
+                    *(tables[t].add(block.get(k)) for k, t in _TABLES.items()),
+                )
+                idx = block_index.get(row)
+                if idx is None:
+                    idx = block_index[row] = len(blocks)
+                    blocks.append(list(row))
+                indices.append(idx)
+            day_layers.append(
+                [
+                    layer["condition_key"],
+                    tables["condition_texts"].add(layer["condition_text"]),
+                    indices,
+                ]
+            )
+        days[day] = day_layers
+
+    return {
+        "format": LAYERS_FORMAT_COMPACT,
+        "tables": {name: table.values for name, table in tables.items()},
+        "blocks": blocks,
+        "days": days,
+    }
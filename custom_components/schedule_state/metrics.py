@@ -0,0 +1,99 @@
+"""Performance metrics for schedule_state sensors."""
+
+from collections import Counter
+from contextlib import contextmanager
+import time
+
+
+class Timing:
+    """Wall time statistics for one operation, in milliseconds"""
+
+    __slots__ = ("count", "total", "last", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        self.max = max(self.max, ms)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "last_ms": round(self.last, 3),
+            "max_ms": round(self.max, 3),
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+        }
+
+
+class SensorMetrics:
+    """Counters and timings for a single schedule sensor"""
+
+    def __init__(self):
+        self.recomputes = 0
+        self.triggers: Counter[str] = Counter()
+        self.last_trigger: str | None = None
+        self.template_renders = 0
+        self.template_cache_hits = 0
+        self.condition_evaluations = 0
+        self.condition_cache_hits = 0
+        self.timings: dict[str, Timing] = {}
+
+    def recompute(self, trigger: str) -> None:
+        """Record that the schedule is being recomputed, and why"""
+        self.recomputes += 1
+        self.triggers[trigger] += 1
+        self.last_trigger = trigger
+
+    def template(self, cache_hit: bool) -> None:
+        if cache_hit:
+            self.template_cache_hits += 1
+        else:
+            self.template_renders += 1
+
+    def condition(self, cache_hit: bool) -> None:
+        if cache_hit:
+            self.condition_cache_hits += 1
+        else:
+            self.condition_evaluations += 1
+
+    @contextmanager
+    def timer(self, name: str):
+        """Measure the wall time of a block of code"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.add((time.perf_counter() - start) * 1000)
+
+    def as_dict(self) -> dict:
+        return {
+            "recomputes": self.recomputes,
+            "last_trigger": self.last_trigger,
+            "triggers": dict(self.triggers),
+            "template_renders": self.template_renders,
+            "template_cache_hits": self.template_cache_hits,
+            "template_hit_ratio": _ratio(
+                self.template_cache_hits, self.template_renders
+            ),
+            "condition_evaluations": self.condition_evaluations,
+            "condition_cache_hits": self.condition_cache_hits,
+            "condition_hit_ratio": _ratio(
+                self.condition_cache_hits, self.condition_evaluations
+            ),
+            "timings": {k: v.as_dict() for k, v in self.timings.items()},
+        }
+
+
+def _ratio(hits: int, misses: int) -> float | None:
+    total = hits + misses
+    return round(hits / total, 3) if total else None
@@ -0,0 +1,133 @@
+"""On-demand profiling of schedule_state sensors."""
+
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt
+
+_LOGGER = logging.getLogger(__name__)
+
+# number of functions / allocation sites in the response (the file has more)
+TOP_RESPONSE = 15
+TOP_REPORT = 50
+
+
+def _top_functions(stats: pstats.Stats, count: int) -> list[dict[str, Any]]:
+    """The functions with the most cumulative time"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": nc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3),
+        }
+        for (filename, line, name), (_, nc, tt, ct, _) in rows[:count]
+    ]
+
+
+def _top_allocations(
+    snapshot: tracemalloc.Snapshot, count: int
+) -> list[dict[str, Any]]:
+    """The lines that allocated the most memory (still allocated at the end)"""
+    return [
+        {
+            "location": str(stat.traceback),
+            "size_kib": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:count]
+    ]
+
+
+def _write_report(
+    path: str,
+    names: list[str],
+    iterations: int,
+    stats: pstats.Stats,
+    snapshot: tracemalloc.Snapshot | None,
+) -> None:
+    """Write the full report (runs in the executor)"""
+    out = io.StringIO()
+    out.write(f"schedule_state profile: {', '.join(names)}\n")
+    out.write(f"iterations: {iterations}\n")
+    out.write("(includes everything else that ran on the event loop meanwhile)\n\n")
+
+    stats.stream = out
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_REPORT)
+
+    if snapshot is not None:
+        out.write("\ntop allocations:\n")
+        for item in _top_allocations(snapshot, TOP_REPORT):
+            out.write(
+                f"{item['location']}: {item['size_kib']} KiB in {item['count']} blocks\n"
+            )
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+
+
+async def async_profile(
+    hass: HomeAssistant, sensors: list, iterations: int, memory: bool
+) -> dict[str, Any]:
+    """Recompute the schedules of some sensors under cProfile (and tracemalloc).
+
+    Recomputing a schedule yields to the event loop, so whatever else runs meanwhile is
+    profiled too.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # only one profiler can be active at a time (e.g. the profiler integration)
+        raise HomeAssistantError(f"cannot profile: {e}") from e
+
+    # don't interfere with anyone else who is already tracing allocations
+    trace_memory = memory and not tracemalloc.is_tracing()
+    snapshot = None
+    start = time.perf_counter()
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        for _ in range(iterations):
+            for sensor in sensors:
+                await sensor.data.process_events("profile")
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            tracemalloc.stop()
+
+    stats = pstats.Stats(profiler)
+    names = [sensor.entity_id for sensor in sensors]
+    path = hass.config.path(
+        f"schedule_state_profile_{dt.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
+    )
+    await hass.async_add_executor_job(
+        _write_report, path, names, iterations, stats, snapshot
+    )
+    _LOGGER.info("profile of %s written to %s", names, path)
+
+    recomputes = iterations * len(sensors)
+    return {
+        "file": path,
+        "sensors": names,
+        "iterations": iterations,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "per_recompute_ms": round(elapsed * 1000 / recomputes, 3) if recomputes else 0,
+        "note": "the profile includes everything else that ran on the event loop meanwhile",
+        "top_functions": _top_functions(stats, TOP_RESPONSE),
+        "allocations": (
+            _top_allocations(snapshot, TOP_RESPONSE) if snapshot is not None else []
+        ),
+    }
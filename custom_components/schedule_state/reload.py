@@ -0,0 +1,100 @@
+"""Reloading schedule_state sensors, rebuilding only those whose configuration changed."""
+
+import asyncio
+import logging
+
+from homeassistant.components.calendar import DOMAIN as CALENDAR
+from homeassistant.components.sensor import DOMAIN as SENSOR
+from homeassistant.config import config_per_platform
+from homeassistant.const import CONF_NAME, SERVICE_RELOAD
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.helpers import entity_platform
+from homeassistant.helpers.reload import (
+    async_integration_yaml_config,
+    async_reload_integration_platforms,
+)
+from homeassistant.helpers.service import async_register_admin_service
+
+from .const import DOMAIN, EVENT_RELOADED, PLATFORMS
+from .coordinator import get_coordinator
+from .sensor import async_setup_platform
+from .snapshot import config_fingerprint
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@callback
+def async_setup_reload(hass: HomeAssistant) -> None:
+    """Register the reload action of the domain"""
+
+    async def _reload_config(call: ServiceCall) -> None:
+        await async_reload_schedules(hass)
+        hass.bus.async_fire(EVENT_RELOADED, context=call.context)
+
+    async_register_admin_service(hass, DOMAIN, SERVICE_RELOAD, _reload_config)
+
+
+async def async_reload_schedules(hass: HomeAssistant) -> None:
+    """Reload the configuration, and only rebuild the sensors that were changed.
+
+    Sensors are matched by name. The others keep their schedule, their overrides and
+    the entities they track; the shared caches only forget what the rebuilt sensors used.
+    """
+    conf = await async_integration_yaml_config(hass, SENSOR)
+    if conf is None:
+        # the errors have been logged - keep the current sensors
+        return
+
+    configs = {
+        config[CONF_NAME]: config
+        for platform, config in config_per_platform(conf, SENSOR)
+        if platform == DOMAIN
+    }
+
+    coordinator = get_coordinator(hass)
+    schedules = coordinator.schedules
+    platforms = entity_platform.async_get_platforms(hass, DOMAIN)
+    sensor_platform = next((p for p in platforms if p.domain == SENSOR), None)
+    if sensor_platform is None:
+        # nothing to add the new sensors to: reload everything, including the calendars,
+        # which are not platforms of the integration but discovered by the sensors
+        schedules.clear()
+        for platform in platforms:
+            if platform.domain == CALENDAR:
+                await platform.async_reset()
+        await async_reload_integration_platforms(hass, DOMAIN, PLATFORMS)
+        return
+
+    outdated = {
+        name: data
+        for name, data in schedules.items()
+        if name not in configs or config_fingerprint(configs[name]) != data.fingerprint
+    }
+    added = [name for name in configs if name not in schedules or name in outdated]
+    _LOGGER.info(
+        "reload: %d sensors added or changed, %d removed, %d unchanged",
+        len(added),
+        len([name for name in outdated if name not in configs]),
+        len(configs) - len(added),
+    )
+
+    # remove the sensors (and their calendars) that were changed or removed
+    for name, data in outdated.items():
+        del schedules[name]
+        coordinator.conditions.forget(name)
+        coordinator.templates.forget(name)
+        for platform in platforms:
+            for entity in list(platform.entities.values()):
+                if getattr(entity, "data", None) is data:
+                    await platform.async_remove_entity(entity.entity_id)
+
+    # the sensors are added once they have all been set up, before the reload is over
+    adding = []
+
+    @callback
+    def async_add_entities(entities, update_before_add: bool = False) -> None:
+        adding.append(sensor_platform.async_add_entities(entities, update_before_add))
+
+    for name in added:
+        await async_setup_platform(hass, configs[name], async_add_entities)
+    await asyncio.gather(*adding)
@@ -4,6 +4,7 @@ Modified to add enriched attributes for schedule-state-card compatibility.
 """
 
 import asyncio
+import bisect
 from collections import OrderedDict
 from contextlib import suppress
 from dataclasses import dataclass
@@ -11,14 +12,19 @@ from datetime import datetime, time, timedelta
 import hashlib
 import locale
 import logging
-from pprint import pformat
 import re
+from time import perf_counter
 from typing import Any, NamedTuple, Optional
 
-from homeassistant.components.sensor import PLATFORM_SCHEMA, SensorEntity
+from homeassistant.components.sensor import (
+    PLATFORM_SCHEMA,
+    SensorEntity,
+    SensorStateClass,
+)
 from homeassistant.const import (
     ATTR_ENTITY_ID,
     CONF_CONDITION,
+    CONF_ENABLED,
     CONF_ICON,
     CONF_ID,
     CONF_NAME,
@@ -30,24 +36,26 @@ from homeassistant.const import (
     SERVICE_TURN_ON,
     STATE_OFF,
     STATE_ON,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
     WEEKDAYS,
+    EntityCategory,
+    Platform,
 )
-from homeassistant.core import HomeAssistant, callback
-from homeassistant.exceptions import (
-    ConditionError,
-    ConditionErrorContainer,
-    ConditionErrorIndex,
-    HomeAssistantError,
-    TemplateError,
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
 )
-from homeassistant.helpers import condition
+from homeassistant.exceptions import ServiceValidationError, TemplateError
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.event import async_track_state_change_event
-from homeassistant.helpers.reload import async_setup_reload_service
 from homeassistant.helpers.restore_state import ExtraStoredData, RestoreEntity
+from homeassistant.helpers.start import async_at_started
 from homeassistant.helpers.template import Template, is_template_string
-from homeassistant.helpers.trace import trace_path
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.util import dt
 import portion as P
@@ -56,6 +64,7 @@ import yaml
 
 from .const import (
     CONF_ALLOW_WRAP,
+    CONF_CALENDAR,
     CONF_COMMENT,
     CONF_DEFAULT_STATE,
     CONF_DURATION,
@@ -64,17 +73,55 @@ from .const import (
     CONF_ERROR_ICON,
     CONF_EVENTS,
     CONF_EXTRA_ATTRIBUTES,
+    CONF_HOURS,
+    CONF_ITERATIONS,
+    CONF_LAYERS_FORMAT,
+    CONF_MEMORY,
     CONF_MINUTES_TO_REFRESH_ON_ERROR,
+    CONF_OCCLUSION_CULLING,
     CONF_REFRESH,
     CONF_START,
     CONF_START_OFFSET,
+    CONF_STATS,
+    CONF_STEP,
+    CONF_STRUCTURE_ATTRIBUTES,
+    CONF_TIMES,
     DEFAULT_ERROR_ICON,
     DEFAULT_ICON,
     DEFAULT_NAME,
     DEFAULT_STATE,
     DOMAIN,
-    PLATFORMS,
+    MAX_FORECAST_HOURS,
+    MAX_SAMPLES,
+    SIGNAL_STRUCTURE_UPDATED,
+)
+from .coordinator import get_coordinator
+from .diagnostics import async_get_diagnostics, cache_statistics
+from .events import (
+    CompiledEvent,
+    EventFailure,
+    EventOutcome,
+    has_enabled_template,
+    static_value,
+)
+from .layers import (
+    LAYERS_FORMAT_COMPACT,
+    LAYERS_FORMAT_VERBOSE,
+    LAYERS_FORMATS,
+    compact_layers,
 )
+from .metrics import SensorMetrics
+from .profile import async_profile
+from .snapshot import config_fingerprint, day_intervals, day_values
+from .timeline import (
+    DaySchedule,
+    Timeline,
+    TimelineEvent,
+    boundary_minutes,
+    segment_as_dict,
+    split_calendar_conditions,
+)
+from .trace import RecomputeTrace, SensorLog, trace_buffer
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -82,6 +129,16 @@ _CONDITION_SCHEMA = vol.All(cv.ensure_list, [cv.CONDITION_SCHEMA])
 
 FORCE_NEW_LAYER = (0, "~~~force-new-layer~~~")
 
+# how long events wait for missing entities once Home Assistant is running, see _wait_for
+WAIT_FOR_ENTITIES = timedelta(minutes=5)
+
+# used to describe template conditions in the layers attribute
+_STATES_RE = re.compile(r"states?\(['\"]([^'\"]+)['\"]\)")
+_ENTITY_REF_RE = re.compile(
+    r"\b(sensor\.\w+|binary_sensor\.\w+|input_\w+\.\w+|switch\.\w+|light\.\w+)"
+)
+_TODAY_AT_RE = re.compile(r"today_at\(['\"](\d+:\d+)['\"]\)")
+
 
 # FIXME not sure how to accept templates for icons
 # IconSchema = vol.Any(
@@ -129,6 +186,12 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_ERROR_ICON, default=DEFAULT_ERROR_ICON): IconSchema,
         vol.Optional(CONF_MINUTES_TO_REFRESH_ON_ERROR, default=5): cv.positive_int,
         vol.Optional(CONF_ALLOW_WRAP, default=False): cv.boolean,
+        vol.Optional(CONF_CALENDAR, default=False): cv.boolean,
+        vol.Optional(CONF_STRUCTURE_ATTRIBUTES, default=True): cv.boolean,
+        vol.Optional(CONF_OCCLUSION_CULLING, default=False): cv.boolean,
+        vol.Optional(CONF_LAYERS_FORMAT, default=LAYERS_FORMAT_VERBOSE): vol.In(
+            LAYERS_FORMATS
+        ),
         vol.Optional(CONF_EXTRA_ATTRIBUTES): {cv.string: vol.Any(cv.template, AnyData)},
     },
 )
@@ -175,6 +238,58 @@ ON_OFF_TOGGLE_SERVICE_SCHEMA = vol.Schema(
 )
 
 
+GET_DIAGNOSTICS_SERVICE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+    }
+)
+
+
+SET_TRACE_SERVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(CONF_ENABLED, default=True): cv.boolean,
+    }
+)
+
+
+GET_FORECAST_SERVICE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(CONF_HOURS, default=24): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_FORECAST_HOURS)
+        ),
+    }
+)
+
+
+GET_STATES_AT_SERVICE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ENTITY_ID): cv.entity_ids,
+            vol.Optional(CONF_TIMES): vol.All(cv.ensure_list, [cv.datetime]),
+            vol.Optional(CONF_START): cv.datetime,
+            vol.Optional(CONF_END): cv.datetime,
+            vol.Optional(CONF_STEP, default=5): vol.All(
+                vol.Coerce(int), vol.Range(min=1)
+            ),
+        }
+    ),
+    cv.has_at_least_one_key(CONF_TIMES, CONF_END),
+)
+
+
+PROFILE_SERVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(CONF_ITERATIONS, default=10): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=1000)
+        ),
+        vol.Optional(CONF_MEMORY, default=True): cv.boolean,
+    }
+)
+
+
 class Override(dict):
     KNOWN_ATTRS = ["id", "state", "start", "end", "expires", "icon"]
 
@@ -194,14 +309,19 @@ class Override(dict):
         try:
             extra = {k: d[k] for k in d if k not in cls.KNOWN_ATTRS}
 
+            # this is quite confusing, because this gets converted to a string and needs to be parsed - see #188
+            # (but not when the sensor is re-added without a restart, e.g. when it is reloaded)
+            expires = d.get("expires")
+            if not isinstance(expires, datetime):
+                expires = dt.parse_datetime(expires)
+
             x = Override(
                 d.get("id"),
                 d.get("state"),
                 # start/end are datetime.time's - no need to parse - see #166
                 d.get("start"),
                 d.get("end"),
-                # this is quite confusing, because this gets converted to a string and needs to be parsed - see #188
-                dt.parse_datetime(d.get("expires")),
+                expires,
                 d.get("icon"),
                 extra,
             )
@@ -240,27 +360,46 @@ async def async_setup_platform(
 ) -> None:
     """Set up the Schedule Sensor."""
 
-    await async_setup_reload_service(hass, DOMAIN, PLATFORMS)
-    await async_setup_services(hass)
+    if discovery_info is not None and discovery_info.get(CONF_STATS):
+        async_add_entities([ScheduleStateStatsSensor()], True)
+        return
 
+    name = config.get(CONF_NAME)
+    coordinator = get_coordinator(hass)
     data = ScheduleSensorData(hass, config)
-    await data.process_events()
 
-    name = config.get(CONF_NAME)
+    # at startup, the entities used by the schedule may not exist yet: serve the schedule
+    # saved before the restart, and recompute once Home Assistant has started
+    snapshot = coordinator.snapshots.pop(name)
+    if not hass.is_running and snapshot is not None:
+        data.restore_snapshot(snapshot)
+    coordinator.snapshots.async_register(name, data.snapshot)
+
+    # otherwise, the schedule is computed after the sensor has been added, see async_added_to_hass
     entity = ScheduleSensor(hass, name, data, config)
-    async_add_entities([entity], True)
+    async_add_entities([entity])
+
+    coordinator.schedules[name] = data
+    if config.get(CONF_CALENDAR):
+        hass.async_create_task(
+            async_load_platform(
+                hass,
+                Platform.CALENDAR,
+                DOMAIN,
+                {CONF_NAME: name},
+                coordinator.hass_config,
+            )
+        )
 
 
 async def async_setup_services(hass: HomeAssistant):
     def get_target_devices(service):
         if entity_ids := service.data.get(ATTR_ENTITY_ID):
             target_devices = [
-                dev
-                for dev in hass.data["sensor"].entities
-                if dev.entity_id in entity_ids
+                dev for dev in schedule_sensors(hass) if dev.entity_id in entity_ids
             ]
         else:
-            target_devices = [e for e in hass.data["sensor"].entities]
+            target_devices = schedule_sensors(hass)
 
         return target_devices
 
@@ -374,6 +513,51 @@ async def async_setup_services(hass: HomeAssistant):
 
         _ = [await asyncio.create_task(coro) for coro in update_tasks]
 
+    async def async_get_diagnostics_handler(service) -> ServiceResponse:
+        return async_get_diagnostics(hass, get_target_devices(service))
+
+    async def async_get_forecast_handler(service) -> ServiceResponse:
+        start = dt.as_local(dt_now())
+        end = start + timedelta(hours=service.data[CONF_HOURS])
+        forecasts = {}
+        for target_device in get_target_devices(service):
+            forecasts[target_device.entity_id] = (
+                await target_device.data.async_get_forecast(start, end)
+            )
+        return forecasts
+
+    async def async_get_states_at_handler(service) -> ServiceResponse:
+        times = requested_times(service.data)
+        response = {}
+        for target_device in get_target_devices(service):
+            timeline = await target_device.data.async_get_timeline()
+            values = timeline.values_at(times)
+            response[target_device.entity_id] = {
+                "times": [t.isoformat() for t in times],
+                "states": [v.state for v in values],
+                "attributes": {
+                    k: [v.attributes.get(k) for v in values]
+                    for k in target_device.data.extra_attributes
+                },
+            }
+        return response
+
+    async def async_set_trace_handler(service):
+        for target_device in get_target_devices(service):
+            target_device.data.log.set_enabled(service.data[CONF_ENABLED])
+
+    async def async_profile_handler(service) -> ServiceResponse:
+        target_devices = get_target_devices(service)
+        response = await async_profile(
+            hass,
+            target_devices,
+            service.data[CONF_ITERATIONS],
+            service.data[CONF_MEMORY],
+        )
+        for target_device in target_devices:
+            await target_device.async_update_ha_state(True)
+        return response
+
     hass.services.async_register(
         DOMAIN,
         "recalculate",
@@ -416,6 +600,40 @@ async def async_setup_services(hass: HomeAssistant):
         async_toggle_handler,
         schema=ON_OFF_TOGGLE_SERVICE_SCHEMA,
     )
+    hass.services.async_register(
+        DOMAIN,
+        "get_diagnostics",
+        async_get_diagnostics_handler,
+        schema=GET_DIAGNOSTICS_SERVICE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_forecast",
+        async_get_forecast_handler,
+        schema=GET_FORECAST_SERVICE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_states_at",
+        async_get_states_at_handler,
+        schema=GET_STATES_AT_SERVICE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "set_trace",
+        async_set_trace_handler,
+        schema=SET_TRACE_SERVICE_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "profile",
+        async_profile_handler,
+        schema=PROFILE_SERVICE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
 
 
 class ScheduleSensor(SensorEntity, RestoreEntity):
@@ -423,12 +641,19 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
 
     _unrecorded_attributes = frozenset({MATCH_ALL})
 
+    # updates are driven by the domain-wide TransitionScheduler instead of polling
+    _attr_should_poll = False
+
     def __init__(self, hass, name, data, config):
         """Initialize the sensor."""
         self.data = data
         self._attributes = {}
         self._name = name
         self._state = None
+        self._listening = False
+        # layers/events can also be fetched with the schedule_state/subscribe websocket command
+        self._structure_attributes = config.get(CONF_STRUCTURE_ATTRIBUTES, True)
+        self._layers_format = config.get(CONF_LAYERS_FORMAT, LAYERS_FORMAT_VERBOSE)
 
         unique_id = hashlib.sha3_512(name.encode("utf-8")).hexdigest()
         self._attr_unique_id = unique_id
@@ -442,7 +667,7 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         if state is not None:
             overrides = state.as_dict()["overrides"]
 
-            if self.hass.is_running:
+            if self.hass.is_running or not self.data.has_schedule:
                 await self.async_update_config(overrides)
             else:
 
@@ -453,25 +678,92 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
                     EVENT_HOMEASSISTANT_START, schedule_start_hass
                 )
 
-        @callback
-        async def recalc_callback(*args):
-            _LOGGER.debug(f"{self.data.name}: something changed {args}")
-            old_state = self._state
-            old_attrs = self.data.extra_attributes
-            await self.data.process_events()
+        # changes to entities used by the schedule are delivered by the shared dispatcher,
+        # and transitions are fired by the shared scheduler
+        dispatcher = self.data.coordinator.dispatcher
+        scheduler = self.data.coordinator.scheduler
+        self._listening = True
+        self._async_track_dependencies()
+        self._async_schedule_transition()
+        self.async_on_remove(lambda: dispatcher.async_untrack(self))
+        self.async_on_remove(lambda: scheduler.async_unschedule(self))
+        snapshots = self.data.coordinator.snapshots
+        self.async_on_remove(lambda: snapshots.async_unregister(self.data.name))
+
+        if not self.data.has_schedule:
+            # compute the schedule together with the other sensors that were just added
+            initial = self.data.coordinator.initial
+            initial.async_add(self, self.async_update, self.async_write_ha_state)
+            self.async_on_remove(lambda: initial.async_remove(self))
+        else:
             await self.async_update()
-            if self._state != old_state or self.data.extra_attributes != old_attrs:
-                self.schedule_update_ha_state(force_refresh=True)
 
-        if len(self.data.entities):
-            _LOGGER.info(
-                f"{self.data.name}: installing callback to trigger on changes to {self.data.entities}"
-            )
-            self.async_on_remove(
-                async_track_state_change_event(
-                    self.hass, self.data.entities, recalc_callback
+        if self.data.warm:
+            if self.hass.is_running:
+                await self._async_warm_recompute()
+            else:
+                self.async_on_remove(
+                    async_at_started(self.hass, self._async_warm_recompute)
                 )
+
+    async def _async_warm_recompute(self, *args):
+        """Replace the schedule restored from the snapshot, now that its entities exist"""
+        if not self.data.warm:
+            # a dependency changed in the meantime, and the schedule was already recomputed
+            return
+        await self.data.process_events("startup")
+        await self.async_update()
+        self.async_write_ha_state()
+
+    async def _async_recalc_callback(self, entity_ids):
+        self.data.log.debug("something changed %s", entity_ids)
+        waiting_for = self.data.waiting_for
+        if waiting_for.issuperset(entity_ids) and unavailable_entities(
+            self.hass, waiting_for
+        ):
+            # recompute once, when everything the schedule is waiting for is available
+            return
+        old_state = self._state
+        old_attrs = self.data.extra_attributes
+        await self.data.process_events("state_change")
+        await self.async_update()
+        if self._state != old_state or self.data.extra_attributes != old_attrs:
+            self.schedule_update_ha_state(force_refresh=True)
+
+    @callback
+    def _async_schedule_transition(self):
+        """Ask the shared scheduler to update the sensor at its next transition"""
+        if not self._listening or self.data.next_transition is None:
+            return
+
+        self.data.coordinator.scheduler.async_schedule(
+            self,
+            self.data.next_transition,
+            self.async_update,
+            self.async_write_ha_state,
+        )
+
+    @callback
+    def _async_track_dependencies(self):
+        """Keep the dispatcher index in sync with the entities used by the schedule"""
+        if not self._listening:
+            return
+
+        if self.data.recomputing:
+            # the entities of the schedule are being collected again
+            return
+
+        dispatcher = self.data.coordinator.dispatcher
+        tracked = dispatcher.entities(self)
+        if tracked != self.data.entities:
+            _LOGGER.debug(
+                "%s: tracking changes to %s (added %s, removed %s)",
+                self.data.name,
+                sorted(self.data.entities),
+                sorted(self.data.entities - tracked),
+                sorted(tracked - self.data.entities),
             )
+        dispatcher.async_track(self, self.data.entities, self._async_recalc_callback)
 
     @property
     def name(self):
@@ -509,8 +801,11 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         self._attributes["errors"] = self.data.error_states
 
         # NEW ATTRIBUTES - Added for schedule-state-card compatibility
-        self._attributes["layers"] = self.data.layers_by_day
-        self._attributes["events"] = self.data.events_list
+        if self._structure_attributes:
+            self._attributes["layers"] = self.data.layers(self._layers_format)
+            self._attributes["layers_format"] = self._layers_format
+            self._attributes["events"] = self.data.events_list
+        self._attributes["structure_version"] = self.data.structure_version
         self._attributes["total_events"] = self.data.total_events_count
         self._attributes["last_update"] = self.data.last_update_time
         self._attributes["default_state"] = self.data.default_state
@@ -526,10 +821,13 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         for key in self.data.extra_attributes.keys():
             self._attributes[key] = self.data.attributes.get(key, None)
 
+        self._async_track_dependencies()
+        self._async_schedule_transition()
+
     async def async_recalculate(self):
         """Recalculate schedule state."""
         _LOGGER.info(f"{self._name}: recalculate")
-        await self.data.process_events()
+        await self.data.process_events("recalculate")
 
     async def async_set_override(
         self, id, state: str, start, end, duration, icon, extra_attributes
@@ -541,7 +839,7 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         if self.data.set_override(
             id, state, start, end, duration, icon, extra_attributes
         ):
-            await self.data.process_events()
+            await self.data.process_events("override")
             return True
 
         return False
@@ -553,7 +851,7 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         """Remove override state."""
         _LOGGER.info(f"{self._name}: remove override {id}")
         if self.data.remove_override(id):
-            await self.data.process_events()
+            await self.data.process_events("override")
             return True
 
         return False
@@ -562,7 +860,7 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         """Clear overrides, if any."""
         _LOGGER.info(f"{self._name}: clear overrides")
         if self.data.clear_overrides():
-            await self.data.process_events()
+            await self.data.process_events("override")
             return True
 
         return False
@@ -572,14 +870,14 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         """This is periodically called by RestoreEntity to save dynamic data"""
         # overrides are only saved every 15 minutes
         # see STATE_DUMP_INTERVAL in restore_state.py -- is there any way to force this when an override is added/removed?
-        _LOGGER.debug(f"{self.name}: extra_restore_state_data = {self.data.overrides}")
+        self.data.log.debug("extra_restore_state_data = %s", self.data.overrides)
         # note: self.data.overrides is saved in native format, without any explicit conversions, but HA is still converting it to text somewhere
         # this is not what the pytest-homeassistant-custom-component does...
         return ScheduleStateExtraStoredData(self.data.overrides)
 
     async def async_update_config(self, override_list: list[Override]) -> None:
         """Called by async_added_to_hass with a list of previously-saved overrides"""
-        _LOGGER.debug(f"{self._name}: async_update_config {override_list}")
+        self.data.log.debug("async_update_config %s", override_list)
 
         overrides = []
         for override_data in override_list:
@@ -590,10 +888,49 @@ class ScheduleSensor(SensorEntity, RestoreEntity):
         # update the schedule if any overrides were found
         if len(overrides):
             self.data.overrides = overrides
-            await self.data.process_events()
+            if self.data.warm or not self.data.has_schedule:
+                # the snapshot already includes them, and is recomputed at startup; or the
+                # schedule has not been computed yet
+                return
+            await self.data.process_events("restore")
             await self.async_update()
 
 
+class ScheduleStateStatsSensor(SensorEntity):
+    """Performance metrics for all schedule_state sensors."""
+
+    _unrecorded_attributes = frozenset({MATCH_ALL})
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:chart-timeline-variant"
+    _attr_name = "Schedule State Stats"
+    _attr_native_unit_of_measurement = "recomputes"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_unique_id = f"{DOMAIN}_stats"
+
+    async def async_update(self) -> None:
+        """Collect the metrics of every schedule sensor."""
+        sensors = schedule_sensors(self.hass)
+        metrics = {s.entity_id: s.data.metrics for s in sensors}
+
+        slowest = sorted(
+            metrics,
+            key=lambda e: (
+                metrics[e].timings["process_events"].total
+                if "process_events" in metrics[e].timings
+                else 0
+            ),
+            reverse=True,
+        )
+
+        self._attr_native_value = sum(m.recomputes for m in metrics.values())
+        self._attr_extra_state_attributes = {
+            "sensors": {e: m.as_dict() for e, m in metrics.items()},
+            "slowest": slowest[:5],
+            **cache_statistics(get_coordinator(self.hass)),
+        }
+
+
 class ScheduleSensorData:
     """The class for handling the state computation."""
 
@@ -605,6 +942,7 @@ class ScheduleSensorData:
         self.events = config.get(CONF_EVENTS, [])
         self.refresh = config.get(CONF_REFRESH)
         self.minutes_to_refresh_on_error = config.get(CONF_MINUTES_TO_REFRESH_ON_ERROR)
+        self.occlusion_culling = config.get(CONF_OCCLUSION_CULLING, False)
         self.default_state = None
         self.default_icon = None
         self.error_icon = None
@@ -612,14 +950,43 @@ class ScheduleSensorData:
         self._states = {}
         self._icons = {}
         self._refresh_time = None
+        self._next_refresh_time = None
+        self._transitions = []
+        self._timeline = None
+        self.next_transition = None
+        self.coordinator = get_coordinator(hass)
+        self.metrics = SensorMetrics()
+        self.traces = trace_buffer()
+        self.log = SensorLog(self.name, _LOGGER)
+        self._trace = None
         self.overrides = []
+        # a snapshot is only restored for the same configuration, see restore_snapshot
+        self.fingerprint = config_fingerprint(config)
+        # the schedule was restored from a snapshot, and has not been recomputed yet
+        self.warm = False
+        self._warm_snapshot = None
         self.known_states = set()
         self.error_states = set()
+        # entities that events failed on because they were not available yet
+        self.waiting_for = set()
+        # when to stop waiting for them, and report the errors (see _can_wait)
+        self._wait_until = None
+        self._missing = False
         self.attributes = {}
         self.entities = set()
         self.force_refresh = None
+        # events that failed in this recompute and in the previous one, see _event_failed
+        self._failures: dict[CompiledEvent, EventFailure] = {}
+        self._last_failures: dict[CompiledEvent, EventFailure] = {}
+        # the last outcome of each event, reused when only retrying failed events
+        self._outcomes: dict[CompiledEvent, EventOutcome | None] = {}
+        self._retrying = False
         self.icon_map = {}
-        self.extra_attributes = config.get(CONF_EXTRA_ATTRIBUTES, {})
+        # templates without any code are never rendered, see static_value
+        self.extra_attributes = {
+            k: static_value(v) for k, v in config.get(CONF_EXTRA_ATTRIBUTES, {}).items()
+        }
+        self._default_state = static_value(config.get(CONF_DEFAULT_STATE))
         self._custom_attributes = {}
 
         # NEW ATTRIBUTES - For enriched data export
@@ -627,16 +994,45 @@ class ScheduleSensorData:
         self.events_list = []  # Raw list of events
         self.total_events_count = 0  # Total event counter
         self.last_update_time = None  # Update timestamp
+        self.structure_version = 0  # Incremented when layers/events change
+        self._compact_layers = None  # compact encoding of layers_by_day, when requested
+        self._compiled_events = None  # config events never change, see _compiled
+        self._compiled_overrides = {}  # id(override) -> (override, compiled)
         self.room_name = config.get(CONF_NAME)  # Room/zone name
 
-    async def process_events(self):
+    async def process_events(self, trigger: str = "manual"):
         """Process the list of events and derive the schedule for the day."""
+        self.metrics.recompute(trigger)
+        # the details of each step are only recorded while the sensor is traced
+        self._trace = trace = RecomputeTrace(trigger, detailed=self.log.enabled)
+        # a retry only evaluates the events that failed, see _outcome
+        self._retrying = trigger == "retry"
+        try:
+            with self.metrics.timer("process_events"):
+                await self._process_events()
+        finally:
+            self._trace = None
+            self._retrying = False
+            trace.finish()
+            self.traces.append(trace)
+
+    async def _process_events(self):
+        trace = self._trace
 
         # keep track of known states and report them in the attributes
         self.known_states = set()
 
         # keep track of the states with errors and report them in the attributes
         self.error_states = set()
+        self._last_failures, self._failures = self._failures, {}
+
+        # collect the entities used by this recompute, so that those which are not used
+        # anymore stop triggering recomputes - unless the outcomes of the events that were
+        # not retried are reused, with their entities
+        if not self._retrying:
+            self.entities = set()
+            self.waiting_for = set()
+            self._missing = False
 
         # FIXME templates not currently supported - see IconSchema above
         self.default_icon = self.evaluate_template(
@@ -652,8 +1048,8 @@ class ScheduleSensorData:
             default=DEFAULT_ERROR_ICON,
         ).result
 
-        self.default_state = self.evaluate_template(
-            self.config,
+        self.default_state = self.evaluate_value(
+            self._default_state,
             CONF_DEFAULT_STATE,
             default=DEFAULT_STATE,
         ).result
@@ -684,143 +1080,540 @@ class ScheduleSensorData:
         )
 
         # now process all defined events and overrides
-        for event in self.events + self.overrides:
-            _LOGGER.debug(f"{self.name}: processing event {event}")
-            state_eval = self.evaluate_template(
-                event,
-                CONF_STATE,
-                default=self.default_state,
-            )
-            if not state_eval.success:
-                # error evaluating template - skip this event
-                continue
+        compiled = self._compiled()
+        if self.occlusion_culling:
+            outcomes = await self._evaluate_events_culled(compiled, allow_wrap_global)
+        else:
+            outcomes = []
+            for idx, event in enumerate(compiled):
+                trace.begin_event(self._event_label(idx))
+                outcome = await self._outcome(event, allow_wrap_global)
+                if outcome is not None and outcome.intervals is not None:
+                    outcomes.append((idx, event, outcome.state, outcome.intervals))
+
+        # Layer on the intervals of each event to the schedule, in order
+        for idx, event, state, intervals in outcomes:
+            if self.occlusion_culling:
+                trace.begin_event(self._event_label(idx))
+            self._paint_event(event, state, intervals, states, icons, attrs)
+
+        # forget the outcomes of removed overrides
+        self._outcomes = {e: self._outcomes[e] for e in compiled if e in self._outcomes}
+        if not self._missing:
+            # everything is available: wait again if something goes missing
+            self._wait_until = None
+        retry_at = [f.retry_at for f in self._failures.values()]
+        if self.waiting_for and self._wait_until is not None:
+            # report the errors if the entities are still missing by then
+            retry_at.append(self._wait_until)
+        self.force_refresh = min(retry_at, default=None)
 
-            state = state_eval.result
-            self.known_states.add(state)
+        self._states = states
+        self._icons = icons
+        self._custom_attributes = attrs
+        self._transitions = self._find_transitions()
+        self._timeline = None
+        self._refresh_time = dt.as_local(dt_now())
+        self._next_refresh_time = self.coordinator.refresh.next_refresh(
+            self.name, self.refresh, self._refresh_time
+        )
+        self.warm = False
+        self._warm_snapshot = None
+        self.coordinator.snapshots.async_changed()
+
+        # NEW: Build enriched attributes
+        trace.begin_event(None)
+        with self.metrics.timer("build_layers"):
+            layers_by_day = await self._build_layers_structure()
+        events_list = await self._serialize_events_list()
+        structure_changed = (
+            layers_by_day != self.layers_by_day or events_list != self.events_list
+        )
+        self.layers_by_day = layers_by_day
+        self.events_list = events_list
+        if structure_changed:
+            self._compact_layers = None
+        self.total_events_count = sum(
+            len(layers) for layers in self.layers_by_day.values()
+        )
+        self.last_update_time = dt.as_local(dt_now()).isoformat()
+        self.log.debug("states=%s icons=%s attrs=%s", states, icons, attrs)
+
+        if structure_changed:
+            # let websocket subscribers know, see websocket_api.py
+            self.structure_version += 1
+            async_dispatcher_send(self.hass, f"{SIGNAL_STRUCTURE_UPDATED}_{self.name}")
 
-            cond = event.get(CONF_CONDITION, None)
+    @property
+    def has_schedule(self) -> bool:
+        """Has the schedule been computed (or restored from a snapshot)?"""
+        return self._refresh_time is not None
+
+    @property
+    def recomputing(self) -> bool:
+        """Is the schedule being recomputed? (see process_events)"""
+        return self._trace is not None
+
+    def snapshot(self) -> dict[str, Any] | None:
+        """What is needed to serve the schedule of the day after a restart"""
+        if self.warm:
+            return self._warm_snapshot
+        if self._refresh_time is None:
+            return None
+
+        today = DaySchedule.from_intervals(
+            self._refresh_time.date(),
+            self._states,
+            self._icons,
+            self._custom_attributes,
+        )
+        return {
+            "fingerprint": self.fingerprint,
+            "default_state": self.default_state,
+            "default_icon": self.default_icon,
+            "error_icon": self.error_icon,
+            "known_states": sorted(self.known_states, key=str),
+            "error_states": sorted(self.error_states, key=str),
+            "entities": sorted(self.entities),
+            "attr_keys": self._attr_keys,
+            **day_values(today),
+        }
 
-            # Calculate new refresh time to be used if there was a problem evaluating the template or condition.
-            # This can happen if the things that the template is dependent on have not been started up by HA yet...
-            # or it could be a problem with the template/condition definition, it doesn't seem possible to know which.
-            new_refresh_time = dt.as_local(dt_now()) + timedelta(
-                minutes=self.minutes_to_refresh_on_error
+    def restore_snapshot(self, snapshot: dict[str, Any]) -> bool:
+        """Serve the schedule saved before a restart, if it is still valid for today"""
+        now = dt.as_local(dt_now())
+        try:
+            if (
+                snapshot["fingerprint"] != self.fingerprint
+                or snapshot["day"] != now.date().isoformat()
+            ):
+                self.log.debug("snapshot is out of date")
+                return False
+            states, icons, attrs = day_intervals(
+                snapshot["bounds"], snapshot["values"], snapshot["attr_keys"]
             )
-            if self.force_refresh is not None:
-                force_refresh = min(self.force_refresh, new_refresh_time)
-            else:
-                force_refresh = new_refresh_time
+            default_state = snapshot["default_state"]
+            default_icon = snapshot["default_icon"]
+            error_icon = snapshot["error_icon"]
+            known_states = set(snapshot["known_states"])
+            error_states = set(snapshot["error_states"])
+            entities = set(snapshot["entities"])
+            attr_keys = list(snapshot["attr_keys"])
+        except (KeyError, TypeError, ValueError) as e:
+            _LOGGER.warning(f"{self.name}: ignoring invalid snapshot ({e})")
+            return False
 
+        self.default_state = default_state
+        self.default_icon = default_icon
+        self.error_icon = error_icon
+        self.known_states = known_states
+        self.error_states = error_states
+        self.entities = entities
+        self._attr_keys = attr_keys
+        self._states = states
+        self._icons = icons
+        self._custom_attributes = attrs
+        self._transitions = self._find_transitions()
+        self._timeline = None
+        self._refresh_time = now
+        self._next_refresh_time = self.coordinator.refresh.next_refresh(
+            self.name, self.refresh, now
+        )
+        self.last_update_time = now.isoformat()
+        self.warm = True
+        self._warm_snapshot = snapshot
+        self.log.debug("restored snapshot, states=%s", states)
+        return True
+
+    def _event_label(self, idx: int) -> str:
+        num_events = len(self.events)
+        return f"event {idx}" if idx < num_events else f"override {idx - num_events}"
+
+    async def _outcome(
+        self, event: CompiledEvent, allow_wrap_global: bool
+    ) -> EventOutcome | None:
+        """Evaluate an event, or reuse its last outcome if only failed events are retried"""
+        failure = self._last_failures.get(event)
+        if (
+            self._retrying
+            and event in self._outcomes
+            and (failure is None or dt.as_local(dt_now()) < failure.retry_at)
+        ):
+            outcome = self._outcomes[event]
+            if failure is not None:
+                self._failures[event] = failure
+            self.log.debug("reusing the last outcome of %s", event.event)
+        else:
+            outcome = await self._evaluate_event(event, allow_wrap_global)
+            self._outcomes[event] = outcome
+
+        if outcome is not None:
+            self.known_states.add(outcome.state)
+            if outcome.error:
+                self.error_states.add(outcome.state)
+        return outcome
+
+    def _event_failed(self, event: CompiledEvent) -> float:
+        """Retry an event that failed later, waiting twice as long after each consecutive failure.
+
+        This can happen if the things that the template is dependent on have not been started
+        up by HA yet... or it could be a problem with the template/condition definition, it
+        doesn't seem possible to know which. The delay is capped by the refresh period, after
+        which the whole schedule is recomputed anyway. Returns the delay in minutes.
+        """
+        last = self._last_failures.get(event)
+        failures = 1 if last is None else last.failures + 1
+        retry = timedelta(minutes=self.minutes_to_refresh_on_error)
+        delay = min(retry * 2 ** min(failures - 1, 16), max(self.refresh, retry))
+        self._failures[event] = EventFailure(failures, dt.as_local(dt_now()) + delay)
+        return delay.total_seconds() / 60
+
+    async def _evaluate_event(
+        self, event: CompiledEvent, allow_wrap_global: bool
+    ) -> EventOutcome | None:
+        """The state of an event and the intervals it covers (None if the state failed)"""
+        trace = self._trace
+        self.log.debug("processing event %s", event.event)
+        state_eval = self.evaluate_value(
+            event.state,
+            CONF_STATE,
+            default=self.default_state,
+        )
+        if not state_eval.success:
+            # error evaluating template - skip this event
+            if not self._wait_for(None, self._template_entities(event.state)):
+                self._event_failed(event)
+                trace.skip(None, "error evaluating state")
+            return None
+
+        state = state_eval.result
+
+        with trace.timed("condition", state) as info:
             cond_result = await _async_process_cond(
-                self.hass, self.name, cond, self.entities
+                self.hass,
+                self.name,
+                event.condition,
+                self.entities,
+                self.metrics,
+                event.condition_handle,
             )
-            if cond_result is False:
-                _LOGGER.debug(
-                    f"{self.name}: {state}: condition was not satisfied - skipping"
-                )
-                continue
-            elif cond_result is None:
-                # There was a problem evaluating the condition - force a refresh
-                self.force_refresh = force_refresh
-                self.error_states.add(state)
-                _LOGGER.error(
-                    f"{self.name}: {state}: error evaluating condition - skipping, will try again in {self.minutes_to_refresh_on_error} minutes"
-                )
-                continue
+            info["result"] = cond_result
+        if cond_result is False:
+            self.log.debug("%s: condition was not satisfied - skipping", state)
+            return EventOutcome(state, None)
+        elif cond_result is None:
+            if self._wait_for(state, await self._condition_entities(event)):
+                return EventOutcome(state, None)
+            # There was a problem evaluating the condition - try again later
+            retry = self._event_failed(event)
+            trace.skip(state, "error evaluating condition")
+            _LOGGER.error(
+                f"{self.name}: {state}: error evaluating condition - skipping, will try again in {retry:g} minutes"
+            )
+            return EventOutcome(state, None, error=True)
 
-            start = await self.get_start(event)
-            end = None if start is None else await self.get_end(event)
-            if None in (start, end):
-                # There was a problem evaluating the template - force a refresh
-                self.force_refresh = force_refresh
-                self.error_states.add(state)
-                _LOGGER.error(
-                    f"{self.name}: {state}: error with start/end definition - skipping, will try again in {self.minutes_to_refresh_on_error} minutes"
-                )
-                continue
+        start = await self.get_start(event)
+        end = None if start is None else await self.get_end(event)
+        if None in (start, end):
+            if self._wait_for(state, self._template_entities(event.start, event.end)):
+                return EventOutcome(state, None)
+            # There was a problem evaluating the template - try again later
+            retry = self._event_failed(event)
+            trace.skip(state, "error with start/end definition")
+            _LOGGER.error(
+                f"{self.name}: {state}: error with start/end definition - skipping, will try again in {retry:g} minutes"
+            )
+            return EventOutcome(state, None, error=True)
 
-            # apply start/end offsets, if any - these can be templates
-            start_offset = None
-            end_offset = None
-            offset_eval = self.evaluate_template(event, CONF_START_OFFSET, default=0)
-            if offset_eval.success:
-                with suppress(ValueError):
-                    start_offset = float(offset_eval.result)
-
-            offset_eval = self.evaluate_template(event, CONF_END_OFFSET, default=0)
-            if offset_eval.success:
-                with suppress(ValueError):
-                    end_offset = float(offset_eval.result)
-
-            if None in (start_offset, end_offset):
-                # There was a problem evaluating the template - force a refresh
-                self.force_refresh = force_refresh
-                self.error_states.add(state)
-                _LOGGER.error(
-                    f"{self.name}: {state}: error with offset definition - skipping, will try again in {self.minutes_to_refresh_on_error} minutes"
-                )
-                continue
+        # apply start/end offsets, if any - these can be templates
+        start_offset = self._get_offset(event.start_offset, CONF_START_OFFSET)
+        end_offset = self._get_offset(event.end_offset, CONF_END_OFFSET)
 
-            start = self.apply_offset(start, start_offset)
-            end = self.apply_offset(end, end_offset)
+        if None in (start_offset, end_offset):
+            if self._wait_for(
+                state, self._template_entities(event.start_offset, event.end_offset)
+            ):
+                return EventOutcome(state, None)
+            # There was a problem evaluating the template - try again later
+            retry = self._event_failed(event)
+            trace.skip(state, "error with offset definition")
+            _LOGGER.error(
+                f"{self.name}: {state}: error with offset definition - skipping, will try again in {retry:g} minutes"
+            )
+            return EventOutcome(state, None, error=True)
 
-            # is wrapping allowed for this event? (default it the global setting)
-            allow_wrap = event.get(CONF_ALLOW_WRAP, allow_wrap_global)
+        start = self.apply_offset(start, start_offset)
+        end = self.apply_offset(end, end_offset)
 
-            # get the interval(s) for this event
-            intervals, error = self._get_intervals(start, end, allow_wrap)
+        # is wrapping allowed for this event? (default it the global setting)
+        allow_wrap = allow_wrap_global if event.allow_wrap is None else event.allow_wrap
+
+        # get the interval(s) for this event
+        intervals, error = self._get_intervals(start, end, allow_wrap)
+
+        if error is not None:
+            trace.skip(state, error)
+            _LOGGER.error(f"{self.name}: {state}: {error} - skipping")
+            return EventOutcome(state, None, error=True)
+
+        return EventOutcome(state, intervals)
+
+    def _template_entities(self, *values) -> set[str]:
+        """The entities read by the last rendering of these values (if they are templates)"""
+        entities = set()
+        for value in values:
+            if isinstance(value, Template):
+                entities.update(self.coordinator.templates.entities(value))
+        return entities
+
+    async def _condition_entities(self, event: CompiledEvent) -> set[str]:
+        """The entities that the condition of an event depends on"""
+        if event.condition is None:
+            return set()
+        compiled = await self.coordinator.conditions.async_get(
+            self.name, event.condition, event.condition_handle
+        )
+        return set(compiled.dependencies) if compiled is not None else set()
 
-            if error is not None:
-                self.error_states.add(state)
-                _LOGGER.error(f"{self.name}: {state}: {error} - skipping")
-                continue
+    def _wait_for(self, state, entities: set[str]) -> bool:
+        """Did an event fail because some of these entities are not available yet?
 
-            state_icon = self.icon_map.get(state, self.default_icon)
-            icon = self.evaluate_template(
-                event,
-                CONF_ICON,
-                state_icon,
-            )
-            if icon.success:
-                state_icon = icon.result
-                if state not in self.icon_map:
-                    # set default icon for this state; this will override the default icon for the schedule_state
-                    self.icon_map[state] = icon.result
-
-            # Layer on the new intervals to the schedule
-            self._add_interval(
-                intervals, state, state_icon, event, states, icons, attrs
+        If so, the event is skipped without reporting an error, and the schedule is recomputed
+        once these entities are available (they are tracked like any other entity used by the
+        schedule) - unless they are still missing a while after Home Assistant has started.
+        """
+        missing = unavailable_entities(self.hass, entities)
+        if not missing or not self._can_wait():
+            return False
+
+        self.waiting_for.update(missing)
+        self.entities.update(missing)
+        self._trace.skip(state, f"waiting for {', '.join(sorted(missing))}")
+        self.log.debug("%s: waiting for %s", state, sorted(missing))
+        return True
+
+    def _can_wait(self) -> bool:
+        """Can events still wait for missing entities?
+
+        While Home Assistant is starting, the entities of other integrations may not exist
+        yet. Once it is running, they are only waited for WAIT_FOR_ENTITIES: after that, they
+        are probably misconfigured, and the events fail like any other error.
+        """
+        self._missing = True
+        if not self.hass.is_running:
+            return True
+        now = dt.as_local(dt_now())
+        if self._wait_until is None:
+            self._wait_until = now + WAIT_FOR_ENTITIES
+        return now < self._wait_until
+
+    def _log_failure(self, value, message: str) -> None:
+        """Log a template that could not be used, unless its entities are not available yet"""
+        if (
+            unavailable_entities(self.hass, self._template_entities(value))
+            and self._can_wait()
+        ):
+            self.log.debug("%s", message)
+        else:
+            _LOGGER.error(f"{self.name}: {message}")
+
+    async def _evaluate_events_culled(
+        self, compiled: list[CompiledEvent], allow_wrap_global: bool
+    ) -> list[tuple]:
+        """Evaluate the events from last to first, skipping those that are hidden by later ones.
+
+        An event is only skipped if the outcome is the same whether it applies or not: its
+        window and state are constants, the icon of its state is already known, none of its
+        extra attributes can show through the later events, and its condition is evaluated
+        without errors (so that errors are reported, and retried, in the same way).
+        """
+        trace = self._trace
+        outcomes = []
+        covered = P.empty()
+        for idx in reversed(range(len(compiled))):
+            event = compiled[idx]
+            trace.begin_event(self._event_label(idx))
+            state = self.default_state if event.state is None else event.state
+            if (
+                not isinstance(state, Template)
+                and state in self.icon_map
+                and self._attributes_hidden(event)
+            ):
+                window = self._static_window(event, allow_wrap_global)
+                if (
+                    window is not None
+                    and window in covered
+                    and await self._hidden_condition(event, state) is not None
+                ):
+                    self.known_states.add(state)
+                    trace.skip(state, "hidden by later events")
+                    continue
+
+            outcome = await self._outcome(event, allow_wrap_global)
+            if outcome is not None and outcome.intervals is not None:
+                covered |= outcome.intervals
+                outcomes.append((idx, event, outcome.state, outcome.intervals))
+
+        outcomes.reverse()
+        return outcomes
+
+    def _attributes_hidden(self, event: CompiledEvent) -> bool:
+        """Are the extra attributes of an event always replaced by those of later events?
+
+        Later events fall back to the default value of an attribute, unless it is None (or a
+        template, which might be None), in which case the value of this event shows through.
+        """
+        for key in event.attributes:
+            default = self.extra_attributes.get(key)
+            if default is None or isinstance(default, Template):
+                return False
+        return True
+
+    async def _hidden_condition(self, event: CompiledEvent, state) -> bool | None:
+        """Evaluate the condition of a hidden event, only to find out whether it fails
+
+        Like any condition, the result is usually shared through the ConditionCache, and its
+        entities are tracked.
+        """
+        if event.condition is None:
+            return True
+        with self._trace.timed("condition", state) as info:
+            result = await _async_process_cond(
+                self.hass,
+                self.name,
+                event.condition,
+                self.entities,
+                self.metrics,
+                event.condition_handle,
             )
+            info["result"] = result
+        return result
+
+    def _static_window(
+        self, event: CompiledEvent, allow_wrap_global: bool
+    ) -> P.Interval | None:
+        """The intervals covered by an event, if they are known without evaluating anything"""
+        times = [event.start or time.min, event.end or time.max]
+        offsets = [event.start_offset or 0, event.end_offset or 0]
+        if not all(isinstance(t, time) for t in times):
+            return None
+        try:
+            offsets = [float(o) for o in offsets]
+        except (ValueError, TypeError):
+            return None
 
-        self._states = states
-        self._icons = icons
-        self._custom_attributes = attrs
-        self._refresh_time = dt.as_local(dt_now())
+        allow_wrap = allow_wrap_global if event.allow_wrap is None else event.allow_wrap
+        intervals, error = self._get_intervals(
+            self.apply_offset(times[0], offsets[0]),
+            self.apply_offset(times[1], offsets[1]),
+            allow_wrap,
+        )
+        return None if error is not None else intervals
 
-        # NEW: Build enriched attributes
-        self.layers_by_day = await self._build_layers_structure()
-        self.events_list = await self._serialize_events_list()
-        self.total_events_count = sum(
-            len(layers) for layers in self.layers_by_day.values()
+    def _paint_event(
+        self, event: CompiledEvent, state, intervals, states, icons, attrs
+    ):
+        state_icon = self.icon_map.get(state, self.default_icon)
+        icon = self.evaluate_value(
+            event.icon,
+            CONF_ICON,
+            state_icon,
         )
-        self.last_update_time = dt.as_local(dt_now()).isoformat()
-        _LOGGER.info(
-            f"\n{pformat(dict(name=self.name, states=states, icons=icons, attrs=attrs))}"
+        if icon.success:
+            state_icon = icon.result
+            if state not in self.icon_map:
+                # set default icon for this state; this will override the default icon for the schedule_state
+                self.icon_map[state] = icon.result
+
+        # Layer on the new intervals to the schedule
+        self._add_interval(
+            intervals, state, state_icon, event.attributes, states, icons, attrs
         )
-        # _LOGGER.debug(
-        #     f"\n{pformat(dict(layers=self.layers_by_day, events=self.events_list))}"
-        # )
+
+    def layers(self, layers_format: int = LAYERS_FORMAT_VERBOSE):
+        """The layer structure by day, in one of the formats of layers.py"""
+        if layers_format != LAYERS_FORMAT_COMPACT:
+            return self.layers_by_day
+        if self._compact_layers is None:
+            self._compact_layers = compact_layers(self.layers_by_day)
+        return self._compact_layers
+
+    def structure(self, layers_format: int = LAYERS_FORMAT_VERBOSE) -> dict:
+        """The layer structure of the schedule, as sent to websocket subscribers"""
+        return {
+            "version": self.structure_version,
+            "default_state": self.default_state,
+            "layers_format": layers_format,
+            "layers": self.layers(layers_format),
+            "events": self.events_list,
+            "total_events": self.total_events_count,
+        }
 
     # NEW METHOD: Serialize events list
+    def _compiled(self) -> list[CompiledEvent]:
+        """The compiled events and overrides.
+
+        Config events are compiled once, and each override once, the first time it is seen.
+        """
+        if self._compiled_events is None:
+            self._compiled_events = [
+                self._compile_event(e, is_override=False) for e in self.events
+            ]
+
+        # the override is kept with its compiled form, so its id cannot be reused
+        compiled_overrides = {}
+        for override in self.overrides:
+            cached = self._compiled_overrides.get(id(override))
+            if cached is None or cached[0] is not override:
+                cached = (override, self._compile_event(override, is_override=True))
+            compiled_overrides[id(override)] = cached
+        self._compiled_overrides = compiled_overrides
+
+        return self._compiled_events + [c for _, c in compiled_overrides.values()]
+
+    def _compile_event(self, event, is_override: bool) -> CompiledEvent:
+        # copy the conditions, so that adding months does not modify the config
+        conditions = event.get(CONF_CONDITION, []) or []
+        if not isinstance(conditions, list):
+            conditions = [conditions]
+        conditions = list(conditions)
+
+        # Extract months from event and add to conditions
+        months = event.get("months", None) or event.get("month", None)
+        if months is not None:
+            month_condition = {"condition": "time", "month": months}
+            # Only add if not already present
+            if month_condition not in conditions:
+                conditions.append(month_condition)
+
+        return CompiledEvent(
+            event,
+            is_override=is_override,
+            display_icon=event.get(CONF_ICON, DEFAULT_ICON),
+            attributes={
+                k: event[k] for k in self.extra_attributes if event.get(k) is not None
+            },
+            conditions=conditions,
+            weekdays=self._get_weekdays_from_condition(conditions),
+            layer_key=self._serialize_conditions(conditions),
+            # conditions enabled by templates are formatted for each recompute
+            condition_text=(
+                None
+                if has_enabled_template(conditions)
+                else self._format_conditions(conditions)
+            ),
+            raw_conditions=self._serialize_list(conditions),
+            raw_state_template=self._serialize_template(event.get(CONF_STATE)),
+            serialized=self._serialize_dict(event),
+        )
+
     async def _serialize_events_list(self):
         """Serialize events list to JSON-compatible format."""
-        serialized_events = []
-        for event in self.events + self.overrides:
-            serialized_event = self._serialize_dict(event)
-            if serialized_event:  # Only add if event has serializable content
-                serialized_events.append(serialized_event)
-
-        return serialized_events
+        return [
+            compiled.serialized
+            for compiled in self._compiled()
+            if compiled.serialized  # Only add if event has serializable content
+        ]
 
     def _serialize_list(self, lst):
         """Recursively serialize a list to JSON-compatible format."""
@@ -886,20 +1679,32 @@ class ScheduleSensorData:
     async def _build_layers_structure(self):
         """Build layers structure organized by day."""
         days = WEEKDAYS
+        compiled = self._compiled()
+        # the same for every day
+        condition_texts = [
+            (
+                c.condition_text
+                if c.condition_text is not None
+                else self._format_conditions(c.conditions)
+            )
+            for c in compiled
+        ]
         layers_by_day = {}
         for day in days:
-            layers_by_day[day] = await self._build_layers_for_day(day)
+            layers_by_day[day] = await self._build_layers_for_day(
+                day, compiled, condition_texts
+            )
         return layers_by_day
 
     # NEW METHOD: Build layers for a specific day
-    async def _build_layers_for_day(self, day):
+    async def _build_layers_for_day(self, day, compiled, condition_texts):
         """Build event layers for a given day, grouped by identical conditions."""
         groups = OrderedDict()
 
         prev_layer = FORCE_NEW_LAYER
-        for event_idx, event in enumerate(self.events + self.overrides):
+        for event_idx, event in enumerate(compiled):
             prev_layer = await self._build_layers_for_event(
-                groups, event_idx, event, day, prev_layer
+                groups, event_idx, event, condition_texts[event_idx], day, prev_layer
             )
 
         # Convert groups to layers
@@ -920,15 +1725,19 @@ class ScheduleSensorData:
 
         return layers
 
-    async def _build_layers_for_event(self, groups, event_idx, event, day, prev_layer):
+    async def _build_layers_for_event(
+        self, groups, event_idx, compiled, condition_text, day, prev_layer
+    ):
         try:
             return await self._build_layers_for_event_unsafe(
-                groups, event_idx, event, day, prev_layer
+                groups, event_idx, compiled, condition_text, day, prev_layer
             )
 
         except Exception as e:
             # Skip events that cannot be processed
-            _LOGGER.error(f"{self.name}: could not process event {event} - {e}")
+            _LOGGER.error(
+                f"{self.name}: could not process event {compiled.event} - {e}"
+            )
             import traceback
 
             error_msg = traceback.format_exc()
@@ -936,29 +1745,16 @@ class ScheduleSensorData:
             return FORCE_NEW_LAYER
 
     async def _build_layers_for_event_unsafe(
-        self, groups, event_idx, event, day, prev_layer
+        self, groups, event_idx, compiled, condition_text, day, prev_layer
     ):
-        conditions = event.get(CONF_CONDITION, []) or []
-        if not isinstance(conditions, list):
-            conditions = [conditions] if conditions else []
-
-        # Extract months from event and add to conditions
-        months = event.get("months", None) or event.get("month", None)
-        if months is not None:
-            month_condition = {"condition": "time", "month": months}
-            # Only add if not already present
-            if month_condition not in conditions:
-                conditions.append(month_condition)
-
         # Filter by weekday
-        weekdays = self._get_weekdays_from_condition(conditions)
-        if day not in weekdays:
+        if day not in compiled.weekdays:
             return FORCE_NEW_LAYER
 
         # It would be nice to refactor with process_events() - lots of duplication
         # Evaluate state
-        state_eval = self.evaluate_template(
-            event, CONF_STATE, default=self.default_state
+        state_eval = self.evaluate_value(
+            compiled.state, CONF_STATE, default=self.default_state
         )
         if not state_eval.success:
             return FORCE_NEW_LAYER
@@ -966,11 +1762,11 @@ class ScheduleSensorData:
         state = state_eval.result
 
         # Get start/end times - EVALUATE TEMPLATES
-        start = await self.get_start(event)
+        start = await self.get_start(compiled)
         if start is None:
             return FORCE_NEW_LAYER
 
-        end = await self.get_end(event)
+        end = await self.get_end(compiled)
         if end is None:
             return FORCE_NEW_LAYER
 
@@ -978,12 +1774,16 @@ class ScheduleSensorData:
         start_offset = 0
         end_offset = 0
 
-        offset_eval = self.evaluate_template(event, CONF_START_OFFSET, default=0)
+        offset_eval = self.evaluate_value(
+            compiled.start_offset, CONF_START_OFFSET, default=0
+        )
         if offset_eval.success:
             with suppress(ValueError):
                 start_offset = float(offset_eval.result)
 
-        offset_eval = self.evaluate_template(event, CONF_END_OFFSET, default=0)
+        offset_eval = self.evaluate_value(
+            compiled.end_offset, CONF_END_OFFSET, default=0
+        )
         if offset_eval.success:
             with suppress(ValueError):
                 end_offset = float(offset_eval.result)
@@ -993,14 +1793,15 @@ class ScheduleSensorData:
         end = self.apply_offset(end, end_offset)
 
         # Check if wrapping is allowed
-        allow_wrap_global = self.config.get(CONF_ALLOW_WRAP, False)
-        allow_wrap = event.get(CONF_ALLOW_WRAP, allow_wrap_global)
+        allow_wrap = compiled.allow_wrap
+        if allow_wrap is None:
+            allow_wrap = self.config.get(CONF_ALLOW_WRAP, False)
 
         # Detect wrapping
         wraps = start > end
 
         # Create condition key for grouping ("default" if no conditions, or "unknown" if an error occurs)
-        new_layer = self._serialize_conditions(conditions)
+        new_layer = compiled.layer_key
         if new_layer == prev_layer[1]:
             condition_key = prev_layer[0]
         else:
@@ -1013,14 +1814,8 @@ class ScheduleSensorData:
         original_start = start.strftime("%H:%M")
         original_end = end.strftime("%H:%M")
 
-        # Format condition text with error handling
-        condition_text = self._format_conditions(conditions)
-
-        # Serialize raw state template
-        raw_state_template = self._serialize_template(event.get(CONF_STATE))
-
-        # Serialize raw conditions
-        raw_conditions = self._serialize_list(conditions)
+        raw_state_template = compiled.raw_state_template
+        raw_conditions = compiled.raw_conditions
 
         # If wrapping, create TWO blocks: one for each day
         if wraps and allow_wrap:
@@ -1037,7 +1832,7 @@ class ScheduleSensorData:
                 "raw_state_template": raw_state_template,
                 "raw_conditions": raw_conditions,
                 "condition_text": condition_text,
-                "icon": event.get(CONF_ICON, DEFAULT_ICON),
+                "icon": compiled.display_icon,
                 "is_default_bg": False,
                 "z_index": 2,
                 "is_dynamic_color": self._is_dynamic_value(state),
@@ -1057,7 +1852,7 @@ class ScheduleSensorData:
                 "raw_state_template": raw_state_template,
                 "raw_conditions": raw_conditions,
                 "condition_text": condition_text,
-                "icon": event.get(CONF_ICON, DEFAULT_ICON),
+                "icon": compiled.display_icon,
                 "is_default_bg": False,
                 "z_index": 2,
                 "is_dynamic_color": self._is_dynamic_value(state),
@@ -1077,7 +1872,7 @@ class ScheduleSensorData:
                 "raw_state_template": raw_state_template,
                 "raw_conditions": raw_conditions,
                 "condition_text": condition_text,
-                "icon": event.get(CONF_ICON, DEFAULT_ICON),
+                "icon": compiled.display_icon,
                 "is_default_bg": False,
                 "z_index": 2,
                 "is_dynamic_color": self._is_dynamic_value(state),
@@ -1193,7 +1988,7 @@ class ScheduleSensorData:
         for cond in conditions:
             try:
                 formatted = self._format_single_condition(cond)
-                _LOGGER.debug(f"Formatted result: '{formatted}'")
+                self.log.debug("formatted condition: '%s'", formatted)
                 if formatted:
                     parts.append(formatted)
             except Exception as e:
@@ -1202,7 +1997,7 @@ class ScheduleSensorData:
                 continue
 
         # Return formatted conditions
-        _LOGGER.debug(f"Final parts: {parts}")
+        self.log.debug("formatted conditions: %s", parts)
         if len(parts) == 0:
             return ""
         elif len(parts) == 1:
@@ -1234,7 +2029,7 @@ class ScheduleSensorData:
             return ""
 
         # DEBUG - log each condition being formatted
-        _LOGGER.debug(f"Formatting condition type: {cond_type}, full cond: {cond}")
+        self.log.debug("formatting condition type: %s, full cond: %s", cond_type, cond)
 
         if cond_type == "state":
             entity_id = cond.get("entity_id", "")
@@ -1320,15 +2115,10 @@ class ScheduleSensorData:
             entities = []
 
             # Find all states('entity_id') or state_attr('entity_id', 'attr')
-            entity_matches = re.findall(r"states?\(['\"]([^'\"]+)['\"]\)", template_str)
-            entities.extend(entity_matches)
+            entities.extend(_STATES_RE.findall(template_str))
 
             # Find entity references like sensor.xxx
-            entity_refs = re.findall(
-                r"\b(sensor\.\w+|binary_sensor\.\w+|input_\w+\.\w+|switch\.\w+|light\.\w+)",
-                template_str,
-            )
-            entities.extend(entity_refs)
+            entities.extend(_ENTITY_REF_RE.findall(template_str))
 
             # Remove duplicates while preserving order
             seen = set()
@@ -1372,9 +2162,7 @@ class ScheduleSensorData:
 
             if "sun_next_rising" in template_str:
                 if "today_at" in template_str:
-                    time_match = re.search(
-                        r"today_at\(['\"](\d+:\d+)['\"]\)", template_str
-                    )
+                    time_match = _TODAY_AT_RE.search(template_str)
                     if time_match:
                         if ">" in template_str:
                             return f"Sunrise after {time_match.group(1)}"
@@ -1384,9 +2172,7 @@ class ScheduleSensorData:
 
             if "sun_next_setting" in template_str:
                 if "today_at" in template_str:
-                    time_match = re.search(
-                        r"today_at\(['\"](\d+:\d+)['\"]\)", template_str
-                    )
+                    time_match = _TODAY_AT_RE.search(template_str)
                     if time_match:
                         if ">" in template_str:
                             return f"Sunset after {time_match.group(1)}"
@@ -1431,33 +2217,33 @@ class ScheduleSensorData:
 
             # Check if there's a list of conditions
             sub_conds = cond.get("conditions", None)
-            _LOGGER.debug(
-                f"NOT condition - has 'conditions' list: {sub_conds is not None}"
+            self.log.debug(
+                "NOT condition - has 'conditions' list: %s", sub_conds is not None
             )
 
             if sub_conds is not None:
                 # Multiple conditions in a list
-                _LOGGER.debug(f"NOT condition - sub_conds: {sub_conds}")
+                self.log.debug("NOT condition - sub_conds: %s", sub_conds)
                 formatted = [self._format_single_condition(c) for c in sub_conds]
-                _LOGGER.debug(
-                    f"NOT condition - formatted list before filter: {formatted}"
+                self.log.debug(
+                    "NOT condition - formatted list before filter: %s", formatted
                 )
                 formatted = [f for f in formatted if f]
-                _LOGGER.debug(
-                    f"NOT condition - formatted list after filter: {formatted}"
+                self.log.debug(
+                    "NOT condition - formatted list after filter: %s", formatted
                 )
 
                 if len(formatted) == 0:
                     return ""
                 elif len(formatted) == 1:
                     result = f"NOT ({formatted[0]})"
-                    _LOGGER.debug(f"NOT condition - final result: '{result}'")
+                    self.log.debug("NOT condition - final result: '%s'", result)
                     return result
                 else:
                     # Multiple conditions in NOT - treat as implicit AND
                     result = f"NOT ({' AND '.join(formatted)})"
-                    _LOGGER.debug(
-                        f"NOT condition - final result (multiple): '{result}'"
+                    self.log.debug(
+                        "NOT condition - final result (multiple): '%s'", result
                     )
                     return result
 
@@ -1499,22 +2285,34 @@ class ScheduleSensorData:
 
         return ret, error
 
-    def _add_interval(self, interval, state, icon, event, states, icons, attrs) -> None:
-        _LOGGER.debug(f"adding {interval} state={state} icon={icon}")
+    def _add_interval(
+        self,
+        interval,
+        state,
+        icon,
+        attributes,
+        states,
+        icons,
+        attrs,
+        track_entities: bool = True,
+    ) -> None:
+        """Paint an interval with a state, icon and extra attributes (values or templates)"""
+        self.log.debug("adding %s state=%s icon=%s", interval, state, icon)
         states[interval] = state
         icons[interval] = icon
 
         # process custom attributes
         for xattr in self._attr_keys:
-            attr_val = event.get(xattr, None)
+            attr_val = attributes.get(xattr, None)
 
             # figure out the attribute value
             val = None
             if attr_val is not None:
-                attr_eval = self.evaluate_template(
-                    {xattr: attr_val},
+                attr_eval = self.evaluate_value(
+                    attr_val,
                     xattr,
                     default=None,
+                    track_entities=track_entities,
                 )
                 if attr_eval.success:
                     val = attr_eval.result
@@ -1523,47 +2321,64 @@ class ScheduleSensorData:
                 # no value specified or template evaluation failed; get the default value
                 # the default here if the template evaluation fails is the "template" itself - YMMV
                 dv = self.extra_attributes[xattr]
-                val = self.evaluate_template(
-                    {xattr: dv},
+                val = self.evaluate_value(
+                    dv,
                     xattr,
                     default=dv,
+                    track_entities=track_entities,
                 ).result
 
             if val is not None:
                 attrs[xattr][interval] = val
 
-    async def get_start(self, event) -> time:
-        template_eval = self.evaluate_template(
-            event,
+    async def get_start(
+        self, event: CompiledEvent, track_entities: bool = True
+    ) -> time:
+        template_eval = self.evaluate_value(
+            event.start,
             CONF_START,
             time.min,
+            track_entities=track_entities,
         )
         if not template_eval.success:
             return None
 
-        inferred_time = self.guess_value(template_eval.result)
+        inferred_time = self._guess_time(template_eval)
         if inferred_time is None:
-            _LOGGER.error(
-                f"{self.name}: FAILED - could not parse '{template_eval.template}'"
+            self._log_failure(
+                template_eval.template,
+                f"FAILED - could not parse '{template_eval.template}'",
             )
         return inferred_time
 
-    async def get_end(self, event) -> time:
-        template_eval = self.evaluate_template(
-            event,
+    async def get_end(self, event: CompiledEvent, track_entities: bool = True) -> time:
+        template_eval = self.evaluate_value(
+            event.end,
             CONF_END,
             time.max,
+            track_entities=track_entities,
         )
         if not template_eval.success:
             return None
 
-        inferred_time = self.guess_value(template_eval.result)
+        inferred_time = self._guess_time(template_eval)
         if inferred_time is None:
-            _LOGGER.error(
-                f"{self.name}: FAILED - could not parse '{template_eval.template}'"
+            self._log_failure(
+                template_eval.template,
+                f"FAILED - could not parse '{template_eval.template}'",
             )
         return inferred_time
 
+    def _get_offset(self, value, key: str, track_entities: bool = True) -> float | None:
+        """Evaluate a start/end offset (in minutes), or None if that fails"""
+        offset_eval = self.evaluate_value(
+            value, key, default=0, track_entities=track_entities
+        )
+        if offset_eval.success:
+            with suppress(ValueError, TypeError):
+                return float(offset_eval.result)
+        return None
+
     def apply_offset(self, t: time, offset: int):
         # constant gymnastics between datetime and time. yuck.
         d = datetime_from_time(t)
@@ -1577,8 +2392,18 @@ class ScheduleSensorData:
         default=None,
         track_entities: bool = True,
     ) -> TemplateResult:
-        value = obj.get(prefix, None)
+        return self.evaluate_value(
+            obj.get(prefix, None), prefix, default, track_entities
+        )
 
+    def evaluate_value(
+        self,
+        value,
+        prefix: str,
+        default=None,
+        track_entities: bool = True,
+    ) -> TemplateResult:
+        """Evaluate a value from the config, which might be a template"""
         debugmsg = ""
 
         if value is None:
@@ -1590,33 +2415,51 @@ class ScheduleSensorData:
             ret = TemplateResult(None, value, True)
 
         else:
-            value.hass = self.hass
+            # identical templates are rendered once and shared by all sensors, see TemplateCache
+            templates = self.coordinator.templates
+            hits = templates.hits
+            timed = self._trace is not None and self._trace.detailed
+            start = perf_counter() if timed else 0
             try:
-                info = value.async_render_to_info(None, parse_result=False)
+                rendered = templates.async_render(value, self.name)
             except (ValueError, TypeError, TemplateError) as e:
-                _LOGGER.error(
-                    f"{self.name}: ... >> {prefix}: failed[1] to evaluate: {e}"
-                )
+                self._log_failure(value, f"... >> {prefix}: failed[1] to evaluate: {e}")
+                ret = TemplateResult(value, default, False)
+            except Exception as e:
+                self._log_failure(value, f"... >> {prefix}: failed[2] to evaluate: {e}")
                 ret = TemplateResult(value, default, False)
             else:
-                try:
-                    ret = TemplateResult(value, info.result(), True)
-                except Exception as e:
-                    _LOGGER.error(
-                        f"{self.name}: ... >> {prefix}: failed[2] to evaluate: {e}"
-                    )
-                    ret = TemplateResult(value, default, False)
+                ret = TemplateResult(value, rendered.result, True)
+            cache_hit = templates.hits > hits
+            self.metrics.template(cache_hit)
+            if timed:
+                self._trace.step(
+                    "template",
+                    prefix,
+                    (perf_counter() - start) * 1000,
+                    cached=cache_hit,
+                    success=ret.success,
+                )
 
             if ret.success and track_entities:
-                if len(info.entities):
-                    debugmsg += f" -- entities used: {info.entities}"
-                for e in info.entities:
-                    self.entities.add(e)
+                if len(rendered.entities):
+                    self.log.debug(
+                        ">> %s: entities used: %s", prefix, sorted(rendered.entities)
+                    )
+                self.entities.update(rendered.entities)
 
         if ret.success:
-            _LOGGER.debug(f"{self.name}: >> {prefix}: {ret.result} {debugmsg}")
+            self.log.debug(">> %s: %s %s", prefix, ret.result, debugmsg)
         return ret
 
+    def _guess_time(self, template_eval: TemplateResult) -> time | None:
+        """guess_value(), sharing the parsed value between sensors that use the same template"""
+        if isinstance(template_eval.template, Template):
+            return self.coordinator.templates.derive(
+                template_eval.template, template_eval.result, "time", self.guess_value
+            )
+        return self.guess_value(template_eval.result)
+
     def guess_value(self, value) -> time | None:
         """After evaluating a template, try to figure out what the resulting value means.
         We are looking for a time value. Dates don't matter."""
@@ -1627,31 +2470,31 @@ class ScheduleSensorData:
         with suppress((ValueError, TypeError)):
             date = dt.parse_datetime(value)
             if date is not None:
-                _LOGGER.debug(f"{self.name}: ...... found datetime: {date}")
+                self.log.debug("...... found datetime: %s", date)
                 tme = dt.as_local(date).time()
                 return tme
 
         with suppress((ValueError, TypeError)):
             date = datetime.fromisoformat(value)
-            _LOGGER.debug(f"{self.name}: ...... found isoformat date: {date}")
+            self.log.debug("...... found isoformat date: %s", date)
             tme = dt.as_local(date).time()
             return tme
 
         with suppress((ValueError, TypeError)):
             tme = dt.parse_time(value)
             if tme is not None:
-                _LOGGER.debug(f"{self.name}: ...... found time: {tme}")
+                self.log.debug("...... found time: %s", tme)
                 return localtime_from_time(tme)
 
         with suppress((ValueError, TypeError)):
             tme = time.fromisoformat(value)
             if tme is not None:
-                _LOGGER.debug(f"{self.name}: ...... found isoformat time: {tme}")
+                self.log.debug("...... found isoformat time: %s", tme)
                 return localtime_from_time(tme)
 
         try:
             date = dt.utc_from_timestamp(int(float(value)))
-            _LOGGER.debug(f"{self.name}: ...... found timestamp: {date}")
+            self.log.debug("...... found timestamp: %s", date)
             tme = dt.as_local(date).time()
             return tme
         except:  # noqa: E722
@@ -1661,29 +2504,39 @@ class ScheduleSensorData:
 
     async def update(self):
         """Get the latest state based on the event schedule."""
+        with self.metrics.timer("update"):
+            await self._update()
+
+    async def _update(self):
         now = dt.as_local(dt_now())
         nu = time(now.hour, now.minute)
 
         # clear out overrides that have expired
         self.overrides = [o for o in self.overrides if dt.as_local(o["expires"]) > now]
         for o in self.overrides:
-            _LOGGER.debug(
-                f"{self.name}: override = {o['start']} - {o['end']} == {o['state']} [expires {o['expires']}]"
+            self.log.debug(
+                "override = %s - %s == %s [expires %s]",
+                o["start"],
+                o["end"],
+                o["state"],
+                o["expires"],
             )
 
         # periodically re-evaluate (refresh) the schedule
         self.attributes = {}
-        time_since_refresh = now - self._refresh_time
-        if time_since_refresh.total_seconds() >= self.refresh.total_seconds() or (
+        if not self.has_schedule:
+            # the first compute is deferred until the sensor has been added
+            await self.process_events("setup")
+        elif now >= self._next_refresh_time or (
             self.force_refresh is not None and now > self.force_refresh
         ):
-            await self.process_events()
-            self.force_refresh = None
+            trigger = "refresh" if now >= self._next_refresh_time else "retry"
+            await self.process_events(trigger)
 
         # find the state and interval that matches the current time
         state, interval = self.find_interval(self._states, nu)
 
-        _LOGGER.debug(f"{self.name}: current state is {state} ({nu})")
+        self.log.debug("current state is %s (%s)", state, nu)
         self.value = state
         self.attributes["start"] = interval.lower
         self.attributes["end"] = interval.upper
@@ -1718,6 +2571,151 @@ class ScheduleSensorData:
             val, _ = self.find_interval(self._custom_attributes[attr], nu)
             self.attributes[attr] = val
 
+        self.next_transition = self._next_transition(now)
+
+    def _find_transitions(self) -> list[int]:
+        """Minutes of the day at which the state, icon or an attribute can change"""
+        # this includes midnight: the schedule for the next day can be different
+        return boundary_minutes(
+            self._states, self._icons, *self._custom_attributes.values()
+        )
+
+    async def async_get_timeline(self) -> Timeline:
+        """The compiled schedule, from which the schedule of any day is derived"""
+        if not self.has_schedule:
+            await self.update()
+        if self._timeline is None:
+            self._timeline = await self._build_timeline()
+        return self._timeline
+
+    async def _build_timeline(self) -> Timeline:
+        """Compile the contribution of each event, without changing the sensor state"""
+        allow_wrap_global = self.config.get(CONF_ALLOW_WRAP, False)
+        default = self._timeline_event(
+            P.closedopen(time.min, time.max),
+            self.default_state,
+            self.default_icon,
+            self.extra_attributes,
+            None,
+            None,
+            None,
+        )
+
+        events = []
+        for event in self._compiled():
+            # weekday conditions and months are checked for each day, the other conditions
+            # use their current value
+            weekdays, conditions = split_calendar_conditions(event.condition)
+            if conditions:
+                cond_result = await _async_process_cond(
+                    self.hass, self.name, conditions, set()
+                )
+                if cond_result is not True:
+                    continue
+
+            state_eval = self.evaluate_value(
+                event.state,
+                CONF_STATE,
+                default=self.default_state,
+                track_entities=False,
+            )
+            if not state_eval.success:
+                continue
+            state = state_eval.result
+
+            start = await self.get_start(event, track_entities=False)
+            end = None if start is None else await self.get_end(event, False)
+            start_offset = self._get_offset(
+                event.start_offset, CONF_START_OFFSET, False
+            )
+            end_offset = self._get_offset(event.end_offset, CONF_END_OFFSET, False)
+            if None in (start, end, start_offset, end_offset):
+                continue
+
+            intervals, error = self._get_intervals(
+                self.apply_offset(start, start_offset),
+                self.apply_offset(end, end_offset),
+                allow_wrap_global if event.allow_wrap is None else event.allow_wrap,
+            )
+            if error is not None:
+                continue
+
+            icon = self.evaluate_value(
+                event.icon,
+                CONF_ICON,
+                self.icon_map.get(state, self.default_icon),
+                track_entities=False,
+            ).result
+
+            events.append(
+                self._timeline_event(
+                    intervals,
+                    state,
+                    icon,
+                    event.attributes,
+                    weekdays,
+                    event.months,
+                    event.expires,
+                )
+            )
+
+        today = DaySchedule.from_intervals(
+            self._refresh_time.date(),
+            self._states,
+            self._icons,
+            self._custom_attributes,
+        )
+        return Timeline(today, default, events)
+
+    async def async_get_forecast(self, start: datetime, end: datetime) -> dict:
+        """The value at `start`, and every change until `end`"""
+        timeline = await self.async_get_timeline()
+        segments = timeline.segments(start, end)
+        return {
+            "current": segment_as_dict(segments[0]) if segments else None,
+            "transitions": [segment_as_dict(seg) for seg in segments[1:]],
+        }
+
+    async def async_get_periods(self, start: datetime, end: datetime) -> list:
+        """The periods with a state other than the default between two times"""
+        timeline = await self.async_get_timeline()
+        return timeline.periods(start, end, self.default_state)
+
+    def _timeline_event(
+        self, intervals, state, icon, attributes, weekdays, months, expires
+    ) -> TimelineEvent:
+        states = P.IntervalDict()
+        icons = P.IntervalDict()
+        attrs = {k: P.IntervalDict() for k in self._attr_keys}
+        self._add_interval(
+            intervals,
+            state,
+            icon,
+            attributes,
+            states,
+            icons,
+            attrs,
+            track_entities=False,
+        )
+        return TimelineEvent(weekdays, months, expires, states, icons, attrs)
+
+    def _next_transition(self, now: datetime) -> datetime:
+        """When does anything reported by the sensor change next?"""
+        minute = now.hour * 60 + now.minute
+        idx = bisect.bisect_right(self._transitions, minute)
+        m = self._transitions[idx] if idx < len(self._transitions) else 24 * 60
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = [midnight + timedelta(minutes=m)]
+
+        # other reasons for the sensor to update
+        candidates.extend(dt.as_local(o["expires"]) for o in self.overrides)
+        if self._next_refresh_time is not None:
+            candidates.append(self._next_refresh_time)
+        if self.force_refresh is not None:
+            candidates.append(self.force_refresh + timedelta(seconds=1))
+
+        return min(c for c in candidates if c > now)
+
     def find_interval(self, states, nu):
         for k, v in states.items():
             for interval in k._intervals:
@@ -1787,7 +2785,7 @@ class ScheduleSensorData:
                 if v is not None:
                     ex_attrs[attr] = v
                 else:
-                    _LOGGER.debug(f"skipping {attr} because value = {v}")
+                    self.log.debug("skipping %s because value = %s", attr, v)
 
             for attr in extra_attributes.keys():
                 if attr not in self._attr_keys:
@@ -1851,6 +2849,31 @@ class ScheduleSensorData:
         return False
 
 
+def requested_times(data: dict) -> list[datetime]:
+    """The times for get_states_at: either a list, or a range with a step"""
+    if CONF_TIMES in data:
+        times = [dt.as_local(t) for t in data[CONF_TIMES]]
+        count = len(times)
+    else:
+        start = dt.as_local(data.get(CONF_START) or dt_now())
+        step = timedelta(minutes=data[CONF_STEP])
+        count = max(0, (dt.as_local(data[CONF_END]) - start) // step + 1)
+
+    if count > MAX_SAMPLES:
+        raise ServiceValidationError(
+            f"too many times requested: {count} (the maximum is {MAX_SAMPLES})"
+        )
+
+    if CONF_TIMES in data:
+        return times
+    return [start + step * i for i in range(count)]
+
+
+def schedule_sensors(hass: HomeAssistant) -> list[ScheduleSensor]:
+    """All the schedule_state sensors"""
+    return [e for e in hass.data["sensor"].entities if isinstance(e, ScheduleSensor)]
+
+
 def simple_time(n: datetime) -> datetime:
     """return n with seconds/microseconds removed"""
     return datetime(
@@ -1901,62 +2924,37 @@ def friendly_time(t):
     return t.strftime(locale.nl_langinfo(locale.T_FMT))
 
 
-async def _async_process_cond(hass, name, cond, entities):
+async def _async_process_cond(hass, name, cond, entities, metrics=None, key=None):
     if cond is None:
         # no condition provided - always evaluates to True
         return True
 
-    _LOGGER.debug(f"{name}: condition {cond}")
-    variables = {}
-    cond_func = await _async_process_if(hass, name, cond)
-    for conf in cond_func.config:
-        referenced = condition.async_extract_entities(conf)
-        if len(referenced):
-            _LOGGER.debug(f"{name}: ... entities used: {referenced}")
-        entities.update(referenced)
-
-    cond_result = cond_func(variables)
-    return cond_result
-
-
-async def _async_process_if(hass, name, if_configs):
-    """Process if checks."""
-    checks = []
-    for if_config in if_configs:
-        try:
-            checks.append(await condition.async_from_config(hass, if_config))
-        except HomeAssistantError as ex:
-            _LOGGER.warning("Invalid condition: %s", ex)
-            return None
-
-    def if_action(variables=None):
-        """AND all conditions."""
-        errors = []
-        for index, check in enumerate(checks):
-            try:
-                with trace_path(["condition", str(index)]):
-                    if not check(hass, variables):
-                        return False
-            except ConditionError as ex:
-                errors.append(
-                    ConditionErrorIndex(
-                        "condition", index=index, total=len(checks), error=ex
-                    )
-                )
+    _LOGGER.debug("%s: condition %s", name, cond)
+    # conditions are compiled once and shared by all sensors, see ConditionCache
+    conditions = get_coordinator(hass).conditions
+    cond_func = await conditions.async_get(name, cond, key)
+    if cond_func is None:
+        return None
 
-        if errors:
-            _LOGGER.warning(
-                "Error evaluating condition in '%s':\n%s",
-                name,
-                ConditionErrorContainer("condition", errors=errors),
-            )
-            return None
+    if len(cond_func.entities):
+        _LOGGER.debug("%s: ... entities used: %s", name, cond_func.entities)
+    entities.update(cond_func.entities)
 
-        return True
+    hits = conditions.hits
+    result = cond_func.evaluate(hass, conditions, name)
+    if metrics is not None:
+        metrics.condition(conditions.hits > hits)
+    return result
 
-    if_action.config = if_configs
 
-    return if_action
+def unavailable_entities(hass: HomeAssistant, entity_ids) -> set[str]:
+    """The entities that do not exist yet, or do not have a state yet"""
+    return {
+        entity_id
+        for entity_id in entity_ids
+        if (state := hass.states.get(entity_id)) is None
+        or state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN)
+    }
 
 
 def dt_now():
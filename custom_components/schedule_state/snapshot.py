@@ -0,0 +1,109 @@
+"""Warm-start snapshots, so that schedules have a state as soon as Home Assistant starts.
+
+The schedule of the current day (and the entities it depends on) is saved with a delay after
+each recompute, and at shutdown. At the next startup, a sensor whose configuration has not
+changed restores the snapshot of the same day instead of evaluating its events while the
+entities they depend on are still being set up, and recomputes once Home Assistant has started.
+"""
+
+from collections.abc import Callable
+from datetime import time
+import hashlib
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+import portion as P
+
+from .cache import condition_key
+from .const import DOMAIN
+from .timeline import MINUTES_PER_DAY, DaySchedule
+
+STORAGE_KEY = f"{DOMAIN}.snapshot"
+STORAGE_VERSION = 1
+
+# seconds to wait after a recompute before saving, so that changes are written together
+SAVE_DELAY = 60
+
+
+def config_fingerprint(config: dict) -> str:
+    """Identifies the configuration of a sensor: a snapshot is only valid for the same one"""
+    return hashlib.sha1(
+        condition_key(config).encode("utf-8"), usedforsecurity=False
+    ).hexdigest()
+
+
+def minute_time(minute: int) -> time:
+    """The time of a minute of the day (1440 is the end of the day)"""
+    if minute >= MINUTES_PER_DAY:
+        return time.max
+    return time(minute // 60, minute % 60)
+
+
+def day_intervals(
+    bounds: list[int], values: list, attr_keys: list[str]
+) -> tuple[P.IntervalDict, P.IntervalDict, dict[str, P.IntervalDict]]:
+    """The states, icons and attributes of a saved day, as the sensor keeps them"""
+    states = P.IntervalDict()
+    icons = P.IntervalDict()
+    attrs = {k: P.IntervalDict() for k in attr_keys}
+    for idx, (state, icon, attributes) in enumerate(values):
+        end = bounds[idx + 1] if idx + 1 < len(bounds) else MINUTES_PER_DAY
+        interval = P.closedopen(minute_time(bounds[idx]), minute_time(end))
+        if state is not None:
+            states[interval] = state
+        icons[interval] = icon
+        for k in attr_keys:
+            if attributes.get(k) is not None:
+                attrs[k][interval] = attributes[k]
+    return states, icons, attrs
+
+
+def day_values(day: DaySchedule) -> dict[str, Any]:
+    """The part of a snapshot that holds the schedule of the day"""
+    return {
+        "day": day.day.isoformat(),
+        "bounds": day.bounds,
+        "values": [[v.state, v.icon, v.attributes] for v in day.values],
+    }
+
+
+class SnapshotStore:
+    """The snapshots of all sensors, in a single file in .storage"""
+
+    def __init__(self, hass: HomeAssistant):
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        # snapshots read at startup, until they are used
+        self._loaded: dict[str, dict[str, Any]] = {}
+        # name -> function returning the current snapshot of a sensor
+        self._sources: dict[str, Callable[[], dict[str, Any] | None]] = {}
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        self._loaded = data if isinstance(data, dict) else {}
+
+    def pop(self, name: str) -> dict[str, Any] | None:
+        """The snapshot saved for a sensor (each one is only used once)"""
+        return self._loaded.pop(name, None)
+
+    @callback
+    def async_register(
+        self, name: str, source: Callable[[], dict[str, Any] | None]
+    ) -> None:
+        self._sources[name] = source
+
+    @callback
+    def async_unregister(self, name: str) -> None:
+        self._sources.pop(name, None)
+
+    @callback
+    def async_changed(self) -> None:
+        """A schedule was recomputed: save the snapshots a bit later"""
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        snapshots = {}
+        for name, source in self._sources.items():
+            if (snapshot := source()) is not None:
+                snapshots[name] = snapshot
+        return snapshots
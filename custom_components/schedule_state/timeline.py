@@ -0,0 +1,374 @@
+"""Compiled timeline of a schedule, for days other than the current one."""
+
+import bisect
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+import logging
+from typing import Any, NamedTuple
+
+from homeassistant.const import WEEKDAYS
+from homeassistant.helpers.template import Template
+from homeassistant.util import dt
+import portion as P
+
+from .cache import _DATE_ONLY_TIME_KEYS
+
+_LOGGER = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+# number of days for which the compiled schedule is kept
+MAX_CACHED_DAYS = 32
+
+# maximum number of days covered by the index of periods
+MAX_INDEXED_DAYS = 366
+
+MONTHS = (
+    "jan",
+    "feb",
+    "mar",
+    "apr",
+    "may",
+    "jun",
+    "jul",
+    "aug",
+    "sep",
+    "oct",
+    "nov",
+    "dec",
+)
+
+
+def boundary_minutes(*interval_dicts: P.IntervalDict) -> list[int]:
+    """Minutes of the day at which any of the values can change (always includes 0 and 1440)"""
+    minutes = {0, MINUTES_PER_DAY}
+    for intervals in interval_dicts:
+        for key in intervals.keys():
+            for interval in key:
+                for t in (interval.lower, interval.upper):
+                    if not isinstance(t, time):
+                        continue
+                    m = t.hour * 60 + t.minute
+                    if t.second or t.microsecond:
+                        # the schedule is evaluated per minute, so the change is seen a minute later
+                        m += 1
+                    minutes.add(m)
+    return sorted(minutes)
+
+
+def split_calendar_conditions(conditions: Any) -> tuple[frozenset[str] | None, list]:
+    """Separate the conditions that only depend on the day of the week from the others.
+
+    Returns the weekdays on which the event can apply (None for every day), and the
+    remaining conditions.
+    """
+    weekdays = None
+    others = []
+    for cond in conditions or []:
+        if (
+            isinstance(cond, dict)
+            and cond.get("condition") == "time"
+            and set(cond) <= _DATE_ONLY_TIME_KEYS
+            and not isinstance(cond.get("enabled", True), Template)
+        ):
+            if not cond.get("enabled", True) or "weekday" not in cond:
+                continue
+            wd = cond["weekday"]
+            days = frozenset([wd] if isinstance(wd, str) else wd)
+            weekdays = days if weekdays is None else weekdays & days
+        else:
+            others.append(cond)
+    return weekdays, others
+
+
+def month_numbers(months: Any) -> frozenset[int] | None:
+    """The months (1-12) of the `months` option of an event, given as numbers or names.
+
+    Returns None for every month, which is also used (with a warning) if some values are
+    not months: such events are not left out of every day.
+    """
+    if months is None:
+        return None
+    numbers = set()
+    for month in months if isinstance(months, (list, tuple, set)) else [months]:
+        if isinstance(month, str) and not month.strip().isdigit():
+            name = month.strip().lower()[:3]
+            if name in MONTHS:
+                numbers.add(MONTHS.index(name) + 1)
+                continue
+        elif str(month).strip().isdigit() and 1 <= int(month) <= 12:
+            numbers.add(int(month))
+            continue
+        _LOGGER.warning(
+            "Invalid month %r in %r - the event applies to every month", month, months
+        )
+        return None
+    return frozenset(numbers)
+
+
+class ScheduleValue(NamedTuple):
+    """What the sensor reports during a segment of the schedule"""
+
+    state: Any
+    icon: str | None
+    attributes: dict[str, Any]
+
+
+class Segment(NamedTuple):
+    start: datetime
+    end: datetime
+    value: ScheduleValue
+
+
+def segment_as_dict(segment: Segment) -> dict[str, Any]:
+    return {
+        "time": segment.start.isoformat(),
+        "state": segment.value.state,
+        "icon": segment.value.icon,
+        "attributes": segment.value.attributes,
+    }
+
+
+class TimelineEvent(NamedTuple):
+    """The contribution of one event (or override) to the schedule of any day"""
+
+    weekdays: frozenset[str] | None
+    months: frozenset[int] | None
+    expires: datetime | None
+    states: P.IntervalDict
+    icons: P.IntervalDict
+    attrs: dict[str, P.IntervalDict]
+
+
+class DaySchedule:
+    """The schedule of one day, as parallel arrays: values[i] applies from minute bounds[i]
+    until bounds[i + 1] (or the end of the day)"""
+
+    __slots__ = ("day", "bounds", "values")
+
+    def __init__(self, day: date, bounds: list[int], values: list[ScheduleValue]):
+        self.day = day
+        self.bounds = bounds
+        self.values = values
+
+    @classmethod
+    def from_intervals(
+        cls,
+        day: date,
+        states: P.IntervalDict,
+        icons: P.IntervalDict,
+        attrs: dict[str, P.IntervalDict],
+    ) -> "DaySchedule":
+        bounds = []
+        values = []
+        for m in boundary_minutes(states, icons, *attrs.values())[:-1]:
+            t = time(m // 60, m % 60)
+            value = ScheduleValue(
+                states.get(t), icons.get(t), {k: v.get(t) for k, v in attrs.items()}
+            )
+            if values and values[-1] == value:
+                continue
+            bounds.append(m)
+            values.append(value)
+        return cls(day, bounds, values)
+
+    def at(self, minute: int) -> ScheduleValue:
+        """The value at a minute of the day"""
+        return self.values[bisect.bisect_right(self.bounds, minute) - 1]
+
+    def end(self, idx: int) -> int:
+        """The minute at which values[idx] stops applying"""
+        return self.bounds[idx + 1] if idx + 1 < len(self.bounds) else MINUTES_PER_DAY
+
+
+def local_datetime(day: date, minute: int) -> datetime:
+    """Local datetime of a minute of a day (1440 is midnight of the next day)"""
+    if minute >= MINUTES_PER_DAY:
+        day += timedelta(days=1)
+        minute -= MINUTES_PER_DAY
+    return datetime.combine(
+        day, time(minute // 60, minute % 60), tzinfo=dt.get_default_time_zone()
+    )
+
+
+class Period(NamedTuple):
+    """A period during which the schedule reports a (non-default) state"""
+
+    start: datetime
+    end: datetime
+    state: Any
+
+
+class PeriodIndex:
+    """Periods covering a range of days, sorted, for O(log n + k) range queries"""
+
+    __slots__ = ("first", "last", "periods", "_ends")
+
+    def __init__(self, first: date, last: date, periods: list[Period]):
+        self.first = first
+        self.last = last
+        self.periods = periods
+        # periods do not overlap, so their ends are sorted too
+        self._ends = [p.end for p in periods]
+
+    def covers(self, first: date, last: date) -> bool:
+        return self.first <= first and last <= self.last
+
+    def between(self, start: datetime, end: datetime) -> list[Period]:
+        """The periods that overlap [start, end)"""
+        found = []
+        idx = bisect.bisect_right(self._ends, start)
+        while idx < len(self.periods) and self.periods[idx].start < end:
+            found.append(self.periods[idx])
+            idx += 1
+        return found
+
+
+class Timeline:
+    """The compiled schedule of a sensor, from which the schedule of any day is derived.
+
+    The current day uses the schedule computed by the sensor itself. Other days start from
+    the default state and layer on the events whose weekday conditions and months match
+    the day.
+    Other conditions and templates use their current values, since their future values
+    cannot be known. Overrides only apply until they expire.
+    """
+
+    def __init__(
+        self,
+        today: DaySchedule,
+        default: TimelineEvent,
+        events: list[TimelineEvent],
+    ):
+        self.today = today
+        self.default = default
+        self.events = events
+        self._days: OrderedDict[date, DaySchedule] = OrderedDict()
+        self._index: PeriodIndex | None = None
+
+    def day(self, day: date) -> DaySchedule:
+        """The compiled schedule for a day"""
+        if day == self.today.day:
+            return self.today
+
+        schedule = self._days.get(day)
+        if schedule is not None:
+            self._days.move_to_end(day)
+            return schedule
+
+        schedule = self._compile_day(day)
+        self._days[day] = schedule
+        if len(self._days) > MAX_CACHED_DAYS:
+            self._days.popitem(last=False)
+        return schedule
+
+    def _compile_day(self, day: date) -> DaySchedule:
+        weekday = WEEKDAYS[day.weekday()]
+        midnight = local_datetime(day, 0)
+        next_midnight = local_datetime(day, MINUTES_PER_DAY)
+
+        states = self.default.states.copy()
+        icons = self.default.icons.copy()
+        attrs = {k: v.copy() for k, v in self.default.attrs.items()}
+
+        for event in self.events:
+            if event.weekdays is not None and weekday not in event.weekdays:
+                continue
+            if event.months is not None and day.month not in event.months:
+                continue
+
+            clip = None
+            if event.expires is not None:
+                expires = dt.as_local(event.expires)
+                if expires <= midnight:
+                    continue
+                if expires < next_midnight:
+                    clip = P.closedopen(time.min, expires.time())
+
+            states.update(event.states if clip is None else event.states[clip])
+            icons.update(event.icons if clip is None else event.icons[clip])
+            for k, v in event.attrs.items():
+                attrs.setdefault(k, P.IntervalDict()).update(
+                    v if clip is None else v[clip]
+                )
+
+        return DaySchedule.from_intervals(day, states, icons, attrs)
+
+    def value_at(self, when: datetime) -> ScheduleValue:
+        """The value of the schedule at any time"""
+        when = dt.as_local(when)
+        return self.day(when.date()).at(when.hour * 60 + when.minute)
+
+    def values_at(self, times: Iterable[datetime]) -> list[ScheduleValue]:
+        """The values of the schedule at many times, with a binary search for each"""
+        values = []
+        schedule = None
+        for when in times:
+            when = dt.as_local(when)
+            if schedule is None or schedule.day != when.date():
+                schedule = self.day(when.date())
+            values.append(schedule.at(when.hour * 60 + when.minute))
+        return values
+
+    def segments(self, start: datetime, end: datetime) -> list[Segment]:
+        """The segments of the schedule between two times, merging identical neighbours"""
+        start = dt.as_local(start)
+        end = dt.as_local(end)
+        segments: list[Segment] = []
+
+        day = start.date()
+        while local_datetime(day, 0) < end:
+            schedule = self.day(day)
+            for idx, value in enumerate(schedule.values):
+                seg_start = local_datetime(day, schedule.bounds[idx])
+                seg_end = local_datetime(day, schedule.end(idx))
+                if seg_end <= start or seg_start >= end:
+                    continue
+                seg_start = max(seg_start, start)
+                seg_end = min(seg_end, end)
+                if segments and segments[-1].value == value:
+                    segments[-1] = segments[-1]._replace(end=seg_end)
+                else:
+                    segments.append(Segment(seg_start, seg_end, value))
+            day += timedelta(days=1)
+
+        return segments
+
+    def periods(
+        self, start: datetime, end: datetime, default_state: Any
+    ) -> list[Period]:
+        """The periods with a state other than the default that overlap [start, end)"""
+        start = dt.as_local(start)
+        end = dt.as_local(end)
+        # a day of margin, so that periods that cross midnight are complete
+        first = start.date() - timedelta(days=1)
+        last = end.date() + timedelta(days=1)
+
+        index = self._index
+        if index is None or not index.covers(first, last):
+            if (
+                index is not None
+                and (max(last, index.last) - min(first, index.first)).days
+                <= MAX_INDEXED_DAYS
+            ):
+                first = min(first, index.first)
+                last = max(last, index.last)
+            index = self._index = self._build_index(first, last, default_state)
+
+        return index.between(start, end)
+
+    def _build_index(self, first: date, last: date, default_state: Any) -> PeriodIndex:
+        periods: list[Period] = []
+        for segment in self.segments(local_datetime(first, 0), local_datetime(last, 0)):
+            state = segment.value.state
+            if (
+                periods
+                and periods[-1].state == state
+                and periods[-1].end == segment.start
+            ):
+                # only the icon or attributes changed
+                periods[-1] = periods[-1]._replace(end=segment.end)
+            elif state != default_state:
+                periods.append(Period(segment.start, segment.end, state))
+        return PeriodIndex(first, last, periods)
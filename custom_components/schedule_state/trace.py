@@ -0,0 +1,151 @@
+"""Recompute traces for schedule_state sensors."""
+
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+import logging
+import time
+
+from homeassistant.util import dt
+
+# number of recompute traces kept for each sensor
+MAX_TRACES = 10
+
+# number of debug messages kept for each sensor that is being traced
+MAX_MESSAGES = 500
+
+
+class RecomputeTrace:
+    """What happened during one recompute of a schedule: what triggered it, how long it took,
+    and - only if the sensor is being traced - how long each event, template and condition
+    took, and which events were skipped"""
+
+    __slots__ = (
+        "trigger",
+        "detailed",
+        "started",
+        "duration_ms",
+        "steps",
+        "skipped",
+        "event",
+        "_t0",
+        "_event_t0",
+    )
+
+    def __init__(self, trigger: str, detailed: bool = False):
+        self.trigger = trigger
+        self.detailed = detailed
+        self.started = dt.utcnow()
+        self.duration_ms: float | None = None
+        self.steps: list[dict] = []
+        self.skipped: list[dict] = []
+        # the event being processed, e.g. "event 2" or "override 0"
+        self.event: str | None = None
+        self._t0 = time.perf_counter()
+        self._event_t0 = self._t0
+
+    def begin_event(self, event: str | None) -> None:
+        """Start processing an event, which ends the previous one"""
+        if not self.detailed:
+            return
+        self._end_event()
+        self.event = event
+        self._event_t0 = time.perf_counter()
+
+    def _end_event(self) -> None:
+        if self.event is not None:
+            self.step(
+                "event", self.event, (time.perf_counter() - self._event_t0) * 1000
+            )
+
+    def step(self, kind: str, name: str, ms: float, **info) -> None:
+        """Record how long something took"""
+        if not self.detailed:
+            return
+        self.steps.append(
+            {
+                "event": self.event,
+                "kind": kind,
+                "name": name,
+                "ms": round(ms, 3),
+                **info,
+            }
+        )
+
+    @contextmanager
+    def timed(self, kind: str, name: str, **info) -> Iterator[dict]:
+        """Record how long a block of code took; the block can add to the returned info"""
+        if not self.detailed:
+            yield info
+            return
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.step(kind, name, (time.perf_counter() - start) * 1000, **info)
+
+    def skip(self, state: str, reason: str) -> None:
+        """Record that the current event was skipped (because of an error, or because it is hidden)"""
+        if not self.detailed:
+            return
+        self.skipped.append({"event": self.event, "state": state, "reason": reason})
+
+    def finish(self) -> None:
+        self._end_event()
+        self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        self.event = None
+
+    def as_dict(self) -> dict:
+        return {
+            "trigger": self.trigger,
+            "started": self.started.isoformat(),
+            "duration_ms": self.duration_ms,
+            "steps": self.steps,
+            "skipped": self.skipped,
+        }
+
+
+def trace_buffer() -> deque[RecomputeTrace]:
+    """Ring buffer holding the most recent traces of a sensor"""
+    return deque(maxlen=MAX_TRACES)
+
+
+class SensorLog:
+    """Debug messages for one sensor.
+
+    Messages use %-style arguments, and are only formatted if they are going to be seen:
+    when debug logging is enabled, or when the sensor is being traced (see the `set_trace`
+    action). Traced messages are formatted right away, so that they show the arguments as they
+    were (and don't keep them alive), and kept in a ring buffer.
+    """
+
+    __slots__ = ("name", "enabled", "_logger", "_messages")
+
+    def __init__(self, name: str, logger: logging.Logger):
+        self.name = name
+        self.enabled = False
+        self._logger = logger
+        self._messages: deque[tuple[float, str]] = deque(maxlen=MAX_MESSAGES)
+
+    def debug(self, msg: str, *args) -> None:
+        if self.enabled:
+            try:
+                text = msg % args if args else msg
+            except (TypeError, ValueError):
+                text = f"{msg} {args}"
+            self._messages.append((time.time(), text))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(f"%s: {msg}", self.name, *args)
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Start (with an empty buffer) or stop tracing"""
+        if enabled and not self.enabled:
+            self._messages.clear()
+        self.enabled = enabled
+
+    def messages(self) -> list[str]:
+        """The traced messages, oldest first"""
+        return [
+            f"{dt.utc_from_timestamp(ts).isoformat()} {text}"
+            for ts, text in self._messages
+        ]
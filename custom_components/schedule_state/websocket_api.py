@@ -0,0 +1,91 @@
+"""Websocket commands for schedule_state."""
+
+from typing import Any
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+import voluptuous as vol
+
+from .const import EVENT_RELOADED, SIGNAL_STRUCTURE_UPDATED
+from .coordinator import get_coordinator
+from .layers import LAYERS_FORMAT_VERBOSE, LAYERS_FORMATS
+from .sensor import schedule_sensors
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant) -> None:
+    websocket_api.async_register_command(hass, ws_subscribe)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "schedule_state/subscribe",
+        vol.Required("entity_id"): cv.entity_id,
+        # the version that the client already has, if any
+        vol.Optional("version"): int,
+        vol.Optional("layers_format", default=LAYERS_FORMAT_VERBOSE): vol.In(
+            LAYERS_FORMATS
+        ),
+    }
+)
+@callback
+def ws_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Send the layer structure of a schedule, and again whenever it changes."""
+    sensor = next(
+        (s for s in schedule_sensors(hass) if s.entity_id == msg["entity_id"]), None
+    )
+    if sensor is None:
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_NOT_FOUND,
+            f"{msg['entity_id']} is not a schedule_state sensor",
+        )
+        return
+
+    # a reload replaces the data of a changed sensor, which is looked up by name
+    name = sensor.data.name
+    layers_format = msg.get("layers_format", LAYERS_FORMAT_VERBOSE)
+
+    @callback
+    def forward_structure() -> None:
+        data = get_coordinator(hass).schedules.get(name)
+        if data is None:
+            end_removed()
+            return
+        connection.send_event(msg["id"], data.structure(layers_format))
+
+    @callback
+    def end_removed(*args) -> None:
+        if name in get_coordinator(hass).schedules:
+            return
+        if (unsub := connection.subscriptions.pop(msg["id"], None)) is not None:
+            unsub()
+            connection.send_error(
+                msg["id"],
+                websocket_api.ERR_NOT_FOUND,
+                f"{msg['entity_id']} was removed",
+            )
+
+    unsubs = [
+        async_dispatcher_connect(
+            hass, f"{SIGNAL_STRUCTURE_UPDATED}_{name}", forward_structure
+        ),
+        hass.bus.async_listen(EVENT_RELOADED, end_removed),
+    ]
+
+    @callback
+    def unsubscribe() -> None:
+        for unsub in unsubs:
+            unsub()
+
+    connection.subscriptions[msg["id"]] = unsubscribe
+    connection.send_result(msg["id"])
+
+    if msg.get("version") != sensor.data.structure_version:
+        forward_structure()
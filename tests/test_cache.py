@@ -0,0 +1,100 @@
+"""Tests the caches shared by schedule_state sensors."""
+
+from homeassistant import setup
+from homeassistant.core import HomeAssistant
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.coordinator import get_coordinator
+
+from .test_schedule import check_state, setup_test_multiple_sensors
+
+
+def make_vacation_config(name):
+    return {
+        "platform": DOMAIN,
+        "name": name,
+        "events": [
+            {
+                "state": "away",
+                "condition": [
+                    {
+                        "condition": "state",
+                        "entity_id": "input_boolean.vacation",
+                        "state": "on",
+                    }
+                ],
+            },
+        ],
+    }
+
+
+async def test_shared_condition_cache(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    await hass.async_block_till_done()
+
+    await setup_test_multiple_sensors(
+        hass, [make_vacation_config(f"vacation {i}") for i in range(5)]
+    )
+
+    conditions = get_coordinator(hass).conditions
+    # identical conditions are only compiled once
+    assert len(conditions) == 1
+
+    for i in range(5):
+        check_state(hass, f"sensor.vacation_{i}", "default")
+
+    evaluations = conditions.evaluations
+    hass.states.async_set("input_boolean.vacation", "on")
+    await hass.async_block_till_done()
+
+    for i in range(5):
+        check_state(hass, f"sensor.vacation_{i}", "away")
+
+    # the condition was evaluated once for the change, and reused by the other sensors
+    assert conditions.evaluations == evaluations + 1
+    assert conditions.hits >= 4
+
+
+async def test_shared_template_cache(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass,
+        "input_datetime",
+        {"input_datetime": {"wakeup": {"has_time": True, "initial": "06:30"}}},
+    )
+    await hass.async_block_till_done()
+
+    def make_config(name):
+        return {
+            "platform": DOMAIN,
+            "name": name,
+            "events": [
+                {
+                    "start": "{{ states('input_datetime.wakeup') }}",
+                    "end": "22:00",
+                    "state": "awake",
+                },
+            ],
+        }
+
+    await setup_test_multiple_sensors(
+        hass, [make_config(f"wakeup {i}") for i in range(5)]
+    )
+    templates = get_coordinator(hass).templates
+
+    # the start template is shared by all sensors
+    assert len([k for k in templates._rendered if "wakeup" in k]) == 1
+
+    renders = templates.renders
+    hits = templates.hits
+    for sensor in [e for e in hass.data["sensor"].entities]:
+        await sensor.async_recalculate()
+    assert templates.renders == renders
+    assert templates.hits > hits
+
+    # a change to the entity invalidates the cached result
+    hass.states.async_set("input_datetime.wakeup", "07:00:00")
+    await hass.async_block_till_done()
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    assert sensor._attributes["layers"]["mon"][0]["blocks"][0]["start"] == "07:00"
@@ -0,0 +1,207 @@
+"""Tests the domain-wide coordination shared by schedule_state sensors."""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from homeassistant import setup
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.coordinator import (
+    MIN_INTERVAL,
+    InitialComputeQueue,
+    RefreshCoordinator,
+    get_coordinator,
+)
+from custom_components.schedule_state.sensor import ScheduleSensorData
+
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    check_state,
+    make_testtime,
+    setup_test_multiple_sensors,
+)
+
+
+def test_refresh_jitter_is_deterministic():
+    refresh = RefreshCoordinator(jitter=True)
+    period = timedelta(hours=6)
+    last = datetime(2024, 12, 20, 4, 0, tzinfo=dt.UTC)
+
+    first = refresh.next_refresh("sensor one", period, last)
+    assert first == refresh.next_refresh("sensor one", period, last)
+    assert last < first <= last + period
+
+    # the next refresh is exactly one period later
+    assert refresh.next_refresh("sensor one", period, first) == first + period
+
+
+def test_refresh_jitter_spreads_sensors():
+    refresh = RefreshCoordinator(jitter=True)
+    period = timedelta(hours=6)
+    last = datetime(2024, 12, 20, 4, 0, tzinfo=dt.UTC)
+
+    times = {refresh.next_refresh(f"sensor {i}", period, last) for i in range(100)}
+    assert len(times) > 90
+
+
+def test_refresh_without_jitter():
+    refresh = RefreshCoordinator(jitter=False)
+    period = timedelta(hours=6)
+    last = datetime(2024, 12, 20, 4, 0, tzinfo=dt.UTC)
+
+    assert refresh.next_refresh("sensor one", period, last) == last + period
+
+
+async def test_coordinator_is_shared(hass: HomeAssistant):
+    await setup_test_multiple_sensors(
+        hass,
+        [
+            {"platform": DOMAIN, "name": "one"},
+            {"platform": DOMAIN, "name": "two"},
+        ],
+    )
+
+    sensors = [e for e in hass.data["sensor"].entities]
+    assert sensors[0].data.coordinator is sensors[1].data.coordinator
+    assert sensors[0].data.coordinator is get_coordinator(hass)
+
+
+async def test_dispatcher_shares_subscriptions(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    await hass.async_block_till_done()
+
+    def make_config(name):
+        return {
+            "platform": DOMAIN,
+            "name": name,
+            "events": [
+                {
+                    "state": "{{ iif(is_state('input_boolean.vacation', 'on'), 'away', 'home') }}",
+                },
+            ],
+        }
+
+    await setup_test_multiple_sensors(hass, [make_config("one"), make_config("two")])
+
+    dispatcher = get_coordinator(hass).dispatcher
+    assert set(dispatcher._unsubs) == {"input_boolean.vacation"}
+    assert len(dispatcher._index["input_boolean.vacation"]) == 2
+
+    check_state(hass, "sensor.one", "home")
+    check_state(hass, "sensor.two", "home")
+
+    hass.states.async_set("input_boolean.vacation", "on")
+    await hass.async_block_till_done()
+
+    check_state(hass, "sensor.one", "away")
+    check_state(hass, "sensor.two", "away")
+
+    # removing a sensor removes it from the index
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    await sensor.async_remove()
+    assert len(dispatcher._index["input_boolean.vacation"]) == 1
+
+
+async def test_transition_scheduler(hass: HomeAssistant):
+    config = {
+        "platform": DOMAIN,
+        "name": "transitions",
+        "events": [
+            {"state": "asleep", "end": "5:30"},
+            {"state": "awake", "start": "5:30", "end": "22:30"},
+        ],
+    }
+
+    now = make_testtime(4, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(hass, [config])
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    assert sensor.should_poll is False
+    check_state(hass, "sensor.transitions", "asleep")
+
+    scheduler = get_coordinator(hass).scheduler
+    awake = dt.as_local(make_testtime(5, 30))
+
+    # follow the scheduled transitions (periodic refreshes may come first)
+    for _ in range(5):
+        when = scheduler.next_transition(sensor)
+        assert when is not None
+        assert dt.as_local(when) <= awake
+        with patch(TIME_FUNCTION_PATH, return_value=dt.as_local(when)):
+            async_fire_time_changed(hass, when)
+            await hass.async_block_till_done()
+        if dt.as_local(when) == awake:
+            break
+
+    check_state(hass, "sensor.transitions", "awake")
+    assert dt.as_local(scheduler.next_transition(sensor)) <= dt.as_local(
+        make_testtime(22, 30)
+    )
+
+    # a transition that is not after the last one is moved just after it, never dropped
+    scheduler.async_schedule(sensor, awake, sensor.async_update, lambda: None)
+    assert scheduler.next_transition(sensor) == awake + timedelta(seconds=MIN_INTERVAL)
+
+
+async def test_initial_computes_are_batched(hass: HomeAssistant):
+    with patch("custom_components.schedule_state.coordinator.INITIAL_BATCH_SIZE", 2):
+        assert await setup.async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    # services are registered with the domain, before any sensor
+    assert hass.services.has_service(DOMAIN, "recalculate")
+
+    coordinator = get_coordinator(hass)
+    pending = []
+    original = ScheduleSensorData.process_events
+
+    async def process_events(data, trigger="manual"):
+        pending.append(len(coordinator.initial))
+        await original(data, trigger)
+
+    now = make_testtime(10, 0)
+    with (
+        patch.object(ScheduleSensorData, "process_events", process_events),
+        patch(TIME_FUNCTION_PATH, return_value=now),
+    ):
+        await setup_test_multiple_sensors(
+            hass,
+            [
+                {
+                    "platform": DOMAIN,
+                    "name": f"batched {i}",
+                    "events": [{"start": "8:00", "end": "12:00", "state": "on"}],
+                }
+                for i in range(5)
+            ],
+        )
+
+    # the sensors were all added first, and then computed two at a time
+    assert pending == [3, 3, 1, 1, 0]
+    for i in range(5):
+        check_state(hass, f"sensor.batched_{i}", "on")
+
+
+async def test_initial_compute_of_removed_sensor(hass: HomeAssistant):
+    queue = InitialComputeQueue(hass, 2)
+    computing = asyncio.Event()
+    resume = asyncio.Event()
+    written = []
+
+    async def update():
+        computing.set()
+        await resume.wait()
+
+    queue.async_add("kept", update, lambda: written.append("kept"))
+    queue.async_add("removed", update, lambda: written.append("removed"))
+    await computing.wait()
+
+    # removed while its schedule is being computed: its state is not written
+    queue.async_remove("removed")
+    resume.set()
+    await hass.async_block_till_done()
+    assert written == ["kept"]
@@ -0,0 +1,392 @@
+"""Tests the compiled events of schedule_state sensors."""
+
+from datetime import time, timedelta
+from unittest.mock import patch
+
+from homeassistant import setup
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+import pytest
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.events import CompiledEvent
+from custom_components.schedule_state.sensor import schedule_sensors
+
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    check_state_at_time,
+    clear_overrides,
+    make_testtime,
+    recalculate,
+    set_override,
+    setup_test_multiple_sensors,
+    setup_test_sensor,
+)
+
+
+async def test_compiled_events(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "compiled",
+            "extra_attributes": {"temperature": "18"},
+            "events": [
+                {
+                    "start": "8:00",
+                    "end": "17:00",
+                    "state": "work",
+                    "start_offset": 15,
+                    "temperature": "21",
+                    "condition": {
+                        "condition": "state",
+                        "entity_id": "input_boolean.vacation",
+                        "state": "off",
+                    },
+                },
+                {"start": "22:00", "end": "6:00", "state": "night", "allow_wrap": True},
+                {"start": "22:00", "end": "6:00", "state": "night"},
+            ],
+        },
+    )
+    sensor = next(s for s in schedule_sensors(hass) if s.entity_id == "sensor.compiled")
+    data = sensor.data
+
+    compiled = data._compiled()
+    work, night, copy = compiled
+    # templates without any code are constants
+    assert work.start_offset == "15"
+    assert work.state == "work"
+    assert work.attributes == {"temperature": "21"}
+    assert work.condition_handle is not None
+    assert night.condition_handle is None
+    assert (night.allow_wrap, copy.allow_wrap) == (True, None)
+    assert work.display_icon == "mdi:calendar-check"
+
+    # compiled once, and without a __dict__
+    with pytest.raises(AttributeError):
+        work.unknown = 1
+    await recalculate(hass, "sensor.compiled", make_testtime(9, 0))
+    assert data._compiled()[0] is work
+
+    now = make_testtime(9, 0)
+    await set_override(hass, "sensor.compiled", now, "away", duration=30)
+    override = data._compiled()[-1]
+    assert isinstance(override, CompiledEvent)
+    assert override.is_override
+    assert override.expires == data.overrides[0]["expires"]
+    assert override.display_icon is None
+    assert data._compiled()[-1] is override
+
+
+async def test_static_templates_not_rendered(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "static",
+            "default_state": "off",
+            "extra_attributes": {"temperature": "18"},
+            "events": [
+                {
+                    "start": "8:00",
+                    "end": "17:00",
+                    "state": "on",
+                    "end_offset": "-30",
+                    "temperature": "21",
+                },
+                {"start": "20:00", "end": "21:00", "state": "late", "icon": "mdi:moon"},
+            ],
+        },
+    )
+    sensor = next(s for s in schedule_sensors(hass) if s.entity_id == "sensor.static")
+    data = sensor.data
+    await recalculate(hass, "sensor.static", make_testtime(9, 0))
+    assert data.metrics.recomputes > 1
+    # nothing was rendered, and no entities are tracked
+    assert data.metrics.template_renders + data.metrics.template_cache_hits == 0
+    assert data.entities == set()
+
+    state = hass.states.get("sensor.static")
+    assert state.state == "on"
+    assert state.attributes["temperature"] == "21"
+    assert state.attributes["end"].hour == 16
+    assert {"off", "on", "late"} <= set(state.attributes["states"])
+
+
+async def test_events_serialized_once(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "serialized",
+            "events": [
+                {"start": "8:00", "end": "17:00", "state": "{{ 'work' }}"},
+                {"start": "18:00", "end": "19:00", "state": "gym"},
+            ],
+        },
+    )
+    sensor = next(
+        s for s in schedule_sensors(hass) if s.entity_id == "sensor.serialized"
+    )
+    data = sensor.data
+    now = make_testtime(9, 0)
+    assert data.events_list[0]["state"] == "{{ 'work' }}"
+
+    with patch.object(data, "_serialize_dict", wraps=data._serialize_dict) as serialize:
+        await recalculate(hass, "sensor.serialized", now)
+        serialize.assert_not_called()
+
+        await set_override(hass, "sensor.serialized", now, "away", duration=30)
+        assert serialize.call_count == 1
+        assert data.events_list[-1]["state"] == "away"
+
+        await recalculate(hass, "sensor.serialized", now)
+        assert serialize.call_count == 1
+
+        # only the new override is serialized
+        await set_override(hass, "sensor.serialized", now, "home", duration=30)
+        assert serialize.call_count == 2
+        assert [e["state"] for e in data.events_list] == [
+            "{{ 'work' }}",
+            "gym",
+            "away",
+            "home",
+        ]
+
+        await clear_overrides(hass, "sensor.serialized", now)
+        assert len(data.events_list) == 2
+
+
+async def test_condition_text_formatted_once(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}, "guests": {}}}
+    )
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "conditions",
+            "events": [
+                {
+                    "start": "8:00",
+                    "end": "17:00",
+                    "state": "work",
+                    "condition": [
+                        {
+                            "condition": "state",
+                            "entity_id": "input_boolean.vacation",
+                            "state": "off",
+                        },
+                        {"condition": "time", "weekday": ["mon", "tue"]},
+                    ],
+                },
+                {
+                    "start": "18:00",
+                    "end": "19:00",
+                    "state": "party",
+                    "condition": {
+                        "condition": "state",
+                        "entity_id": "input_boolean.guests",
+                        "state": "on",
+                        "enabled": "{{ 1 == 1 }}",
+                    },
+                },
+            ],
+        },
+    )
+    sensor = next(
+        s for s in schedule_sensors(hass) if s.entity_id == "sensor.conditions"
+    )
+    data = sensor.data
+
+    blocks = {
+        b["state_value"]: b
+        for layer in data.layers_by_day["mon"]
+        for b in layer["blocks"]
+    }
+    assert (
+        blocks["work"]["condition_text"]
+        == "input_boolean.vacation == off AND Days: Mon, Tue"
+    )
+    assert blocks["party"]["condition_text"] == "input_boolean.guests == on"
+    assert "work" not in {
+        b["state_value"] for layer in data.layers_by_day["wed"] for b in layer["blocks"]
+    }
+
+    with patch.object(
+        data, "_format_conditions", wraps=data._format_conditions
+    ) as format_conditions:
+        recomputes = data.metrics.recomputes
+        await recalculate(hass, "sensor.conditions", make_testtime(9, 0))
+        # only the condition that is enabled by a template, once for all days
+        assert format_conditions.call_count == data.metrics.recomputes - recomputes
+        assert format_conditions.call_args[0][0][0]["enabled"].template
+
+
+def make_layered_config(name, culling):
+    return {
+        "platform": DOMAIN,
+        "name": name,
+        "occlusion_culling": culling,
+        "extra_attributes": {"temperature": "18"},
+        "events": [
+            {
+                "start": "9:00",
+                "end": "10:00",
+                "state": "meeting",
+                "icon": "mdi:account-group",
+                "condition": {
+                    "condition": "state",
+                    "entity_id": "input_boolean.vacation",
+                    "state": "off",
+                },
+            },
+            {"start": "8:00", "end": "12:00", "state": "work", "temperature": "20"},
+            {
+                "start": "11:00",
+                "end": "11:30",
+                "state": "{{ 'call' }}",
+                "condition": {
+                    "condition": "state",
+                    "entity_id": "input_boolean.vacation",
+                    "state": "off",
+                },
+            },
+            {"start": "6:00", "end": "18:00", "state": "work", "temperature": "21"},
+        ],
+    }
+
+
+async def test_occlusion_culling(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    await setup_test_multiple_sensors(
+        hass,
+        [
+            make_layered_config("culled", True),
+            make_layered_config("painted", False),
+        ],
+    )
+    sensors = {s.entity_id: s for s in schedule_sensors(hass)}
+    culled = sensors["sensor.culled"].data
+    painted = sensors["sensor.painted"].data
+    culled.log.set_enabled(True)
+
+    # the same schedule, the same known states
+    assert culled._states.as_dict() == painted._states.as_dict()
+    assert culled._icons.as_dict() == painted._icons.as_dict()
+    assert culled._custom_attributes == painted._custom_attributes
+    assert culled.known_states == painted.known_states
+    assert {"meeting", "call", "work"} <= culled.known_states
+    for h in (7, 9, 11, 17):
+        now = make_testtime(h, 15)
+        await recalculate(hass, "sensor.culled", now)
+        await recalculate(hass, "sensor.painted", now)
+        culled_state = hass.states.get("sensor.culled")
+        painted_state = hass.states.get("sensor.painted")
+        assert culled_state.state == painted_state.state == "work"
+        assert culled_state.attributes["temperature"] == "21"
+
+    # the events that are hidden by the last one are not evaluated, except for the
+    # template state, and the first recompute which has to learn the icon of each state;
+    # the conditions of hidden events are still checked for errors
+    trace = culled.traces[-1]
+    assert [s["event"] for s in trace.skipped] == ["event 1", "event 0"]
+    conditions = [s for s in trace.steps if s["kind"] == "condition"]
+    assert [s["event"] for s in conditions] == ["event 3", "event 2", "event 0"]
+    assert culled.metrics.template_renders + culled.metrics.template_cache_hits > 0
+
+
+async def test_occlusion_culling_same_attributes_and_errors(hass: HomeAssistant):
+    hass.states.async_set("sensor.outside", "not a number")
+
+    def make_config(name, culling):
+        return {
+            "platform": DOMAIN,
+            "name": name,
+            "occlusion_culling": culling,
+            "extra_attributes": {"mode": None},
+            "events": [
+                # hidden, but its attribute shows through the last event
+                {"start": "8:00", "end": "12:00", "state": "work", "mode": "eco"},
+                # hidden, but its condition fails
+                {
+                    "start": "13:00",
+                    "end": "14:00",
+                    "state": "work",
+                    "condition": {
+                        "condition": "numeric_state",
+                        "entity_id": "sensor.outside",
+                        "below": 10,
+                    },
+                },
+                {"start": "6:00", "end": "18:00", "state": "work"},
+            ],
+        }
+
+    now = make_testtime(9, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(
+            hass, [make_config("culled", True), make_config("painted", False)]
+        )
+    sensors = {s.entity_id: s for s in schedule_sensors(hass)}
+    culled = sensors["sensor.culled"].data
+    painted = sensors["sensor.painted"].data
+
+    assert culled._custom_attributes == painted._custom_attributes
+    assert culled._custom_attributes["mode"][time(9, 0)] == "eco"
+    assert culled.error_states == painted.error_states == {"work"}
+    assert culled.force_refresh == painted.force_refresh is not None
+    assert culled.entities == painted.entities
+    for entity_id in ("sensor.culled", "sensor.painted"):
+        state = hass.states.get(entity_id)
+        assert state.attributes["mode"] == "eco"
+        assert state.attributes["errors"] == {"work"}
+
+
+async def test_failed_events_retried_with_backoff(hass: HomeAssistant):
+    hass.states.async_set("input_boolean.early", "on")
+    now = dt.as_local(make_testtime(4, 0))
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        # refreshes happen exactly an hour after the last recompute
+        await setup.async_setup_component(
+            hass, DOMAIN, {DOMAIN: {"refresh_jitter": False}}
+        )
+        await setup_test_sensor(
+            hass,
+            {
+                "platform": DOMAIN,
+                "name": "retries",
+                "refresh": "1:00:00",
+                "events": [
+                    {
+                        "state": "on",
+                        "start": "{{ '8:00' if is_state('input_boolean.early', 'on') else '9:00' }}",
+                    },
+                    {"state": "broken", "start": "{{ 1 / 0 }}"},
+                ],
+            },
+        )
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    data = sensor.data
+    data.log.set_enabled(True)
+    assert "broken" in data.error_states
+    assert data.force_refresh == now + timedelta(minutes=5)
+
+    # only the failed event is evaluated again, and the delay doubles each time
+    # (up to the refresh period)
+    for delay in (10, 20, 40, 60):
+        now = data.force_refresh + timedelta(seconds=1)
+        await check_state_at_time(hass, sensor, now, "default")
+        trace = data.traces[-1]
+        assert trace.trigger == "retry"
+        templates = {s["event"] for s in trace.steps if s["kind"] == "template"}
+        assert "event 1" in templates and "event 0" not in templates
+        assert data.force_refresh == now + timedelta(minutes=delay)
+
+    await check_state_at_time(hass, sensor, now.replace(hour=8, minute=1), "on")
@@ -0,0 +1,231 @@
+"""Tests the performance metrics of schedule_state sensors."""
+
+import cProfile
+import logging
+import tracemalloc
+from unittest.mock import patch
+
+from homeassistant import setup
+from homeassistant.components.sensor import DOMAIN as SENSOR
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+import pytest
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.trace import SensorLog
+
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    make_testtime,
+    recalculate,
+    setup_test_sensor,
+)
+
+
+async def test_sensor_metrics(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "metrics",
+            "events": [{"start": "8:00", "end": "17:00", "state": "busy"}],
+        },
+    )
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    metrics = sensor.data.metrics
+
+    assert metrics.recomputes >= 1
+    assert metrics.triggers["setup"] == 1
+    assert metrics.timings["process_events"].count == metrics.recomputes
+
+    await recalculate(hass, "sensor.metrics", make_testtime(9, 0))
+    assert metrics.last_trigger == "recalculate"
+    assert metrics.as_dict()["triggers"]["recalculate"] == 1
+
+
+async def test_stats_entity(hass: HomeAssistant):
+    ret = await setup.async_setup_component(
+        hass,
+        SENSOR,
+        {
+            DOMAIN: {"stats": True},
+            SENSOR: [
+                {
+                    "platform": DOMAIN,
+                    "name": f"stats {i}",
+                    "events": [{"start": "8:00", "end": "17:00", "state": "busy"}],
+                }
+                for i in range(3)
+            ],
+        },
+    )
+    await hass.async_block_till_done()
+    assert ret, "Setup failed"
+
+    stats = [
+        e for e in hass.data["sensor"].entities if e.unique_id == f"{DOMAIN}_stats"
+    ]
+    assert len(stats) == 1
+    await stats[0].async_update_ha_state(True)
+
+    state = hass.states.get(stats[0].entity_id)
+    assert int(state.state) >= 3
+    assert set(state.attributes["sensors"]) == {f"sensor.stats_{i}" for i in range(3)}
+    assert state.attributes["condition_cache"]["size"] == 0
+    assert len(state.attributes["slowest"]) == 3
+
+
+async def test_diagnostics(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "diagnostics",
+            "events": [
+                {"start": "8:00", "end": "17:00", "state": "busy"},
+                {"start": "{{ 'garbage' }}", "end": "18:00", "state": "broken"},
+            ],
+        },
+    )
+    # the details of the recomputes are only recorded while the sensor is traced
+    await hass.services.async_call(
+        DOMAIN, "set_trace", target={"entity_id": "sensor.diagnostics"}, blocking=True
+    )
+    await recalculate(hass, "sensor.diagnostics", make_testtime(9, 0))
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        "get_diagnostics",
+        target={"entity_id": "sensor.diagnostics"},
+        blocking=True,
+        return_response=True,
+    )
+    diagnostics = response["sensors"]["sensor.diagnostics"]
+
+    assert {"start": "08:00:00", "end": "17:00:00", "value": "busy"} in diagnostics[
+        "timeline"
+    ]["states"]
+    assert "08:00" in diagnostics["transitions"]
+    assert diagnostics["errors"] == ["broken"]
+
+    # only the trigger and duration of the recomputes before tracing are kept
+    untraced = [t for t in diagnostics["traces"] if t["trigger"] != "recalculate"]
+    assert untraced and all(t["duration_ms"] is not None for t in untraced)
+    assert not any(t["steps"] for t in untraced)
+
+    trace = [t for t in diagnostics["traces"] if t["trigger"] == "recalculate"][-1]
+    assert trace["skipped"] == [
+        {
+            "event": "event 1",
+            "state": "broken",
+            "reason": "error with start/end definition",
+        }
+    ]
+    events = [s["name"] for s in trace["steps"] if s["kind"] == "event"]
+    assert events == ["event 0", "event 1"]
+    assert any(s["kind"] == "template" and s["name"] == "start" for s in trace["steps"])
+
+
+async def test_trace_messages(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "traced",
+            "events": [{"start": "8:00", "end": "17:00", "state": "busy"}],
+        },
+    )
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    assert sensor.data.log.messages() == []
+
+    await hass.services.async_call(
+        DOMAIN, "set_trace", target={"entity_id": "sensor.traced"}, blocking=True
+    )
+    await recalculate(hass, "sensor.traced", make_testtime(9, 0))
+
+    messages = sensor.data.log.messages()
+    assert any("processing event" in m for m in messages)
+    assert any("current state is busy" in m for m in messages)
+
+    await hass.services.async_call(
+        DOMAIN,
+        "set_trace",
+        {"enabled": False},
+        target={"entity_id": "sensor.traced"},
+        blocking=True,
+    )
+    await recalculate(hass, "sensor.traced", make_testtime(9, 0))
+    assert sensor.data.log.messages() == messages
+
+
+def test_trace_messages_formatted_when_logged():
+    log = SensorLog("formatted", logging.getLogger(__name__))
+    log.set_enabled(True)
+    entity_ids = {"sensor.one"}
+    log.debug("something changed %s", entity_ids)
+
+    # later changes to the arguments are not seen
+    entity_ids.add("sensor.two")
+    assert log.messages()[0].endswith("something changed {'sensor.one'}")
+
+
+async def test_profile(hass: HomeAssistant, tmp_path):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "profiled",
+            "events": [{"start": "8:00", "end": "17:00", "state": "busy"}],
+        },
+    )
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    recomputes = sensor.data.metrics.recomputes
+    hass.config.config_dir = str(tmp_path)
+
+    with patch(TIME_FUNCTION_PATH, return_value=make_testtime(9, 0)):
+        response = await hass.services.async_call(
+            DOMAIN,
+            "profile",
+            {"iterations": 3},
+            target={"entity_id": "sensor.profiled"},
+            blocking=True,
+            return_response=True,
+        )
+
+    assert response["iterations"] == 3
+    assert sensor.data.metrics.triggers["profile"] == 3
+    assert sensor.data.metrics.recomputes >= recomputes + 3
+    assert any("process_events" in f["function"] for f in response["top_functions"])
+    assert response["allocations"]
+
+    with open(response["file"], encoding="utf-8") as f:
+        report = f.read()
+    assert "sensor.profiled" in report
+    assert "top allocations" in report
+
+
+async def test_profile_already_active(hass: HomeAssistant, tmp_path):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "profiled",
+            "events": [{"start": "8:00", "end": "17:00", "state": "busy"}],
+        },
+    )
+    hass.config.config_dir = str(tmp_path)
+
+    other = cProfile.Profile()
+    other.enable()
+    try:
+        with pytest.raises(HomeAssistantError, match="already active"):
+            await hass.services.async_call(
+                DOMAIN,
+                "profile",
+                target={"entity_id": "sensor.profiled"},
+                blocking=True,
+                return_response=True,
+            )
+    finally:
+        other.disable()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,164 @@
+"""Tests reloading schedule_state sensors."""
+
+from copy import deepcopy
+from unittest.mock import patch
+
+from homeassistant import setup
+from homeassistant.components.sensor import DOMAIN as SENSOR
+from homeassistant.const import SERVICE_RELOAD, STATE_UNAVAILABLE
+from homeassistant.core import HomeAssistant
+
+from custom_components.schedule_state.const import DOMAIN, EVENT_RELOADED
+from custom_components.schedule_state.coordinator import get_coordinator
+
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    check_state,
+    make_testtime,
+    set_override,
+    setup_test_multiple_sensors,
+)
+
+
+def schedule(name: str, state: str, start: str = "8:00") -> dict:
+    return {
+        "platform": DOMAIN,
+        "name": name,
+        "events": [{"start": start, "end": "12:00", "state": state}],
+    }
+
+
+async def reload(hass: HomeAssistant, config: list[dict], now) -> None:
+    with (
+        # the file is read again each time
+        patch(
+            "homeassistant.config.load_yaml_config_file",
+            side_effect=lambda *args: {SENSOR: deepcopy(config)},
+        ),
+        patch(TIME_FUNCTION_PATH, return_value=now),
+    ):
+        await hass.services.async_call(DOMAIN, SERVICE_RELOAD, blocking=True)
+        await hass.async_block_till_done()
+
+
+async def test_reload_only_changed_sensors(hass: HomeAssistant):
+    now = make_testtime(10, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(
+            hass,
+            [
+                schedule("kept", "on"),
+                schedule("changed", "on"),
+                schedule("removed", "on"),
+            ],
+        )
+    schedules = get_coordinator(hass).schedules
+    kept = schedules["kept"]
+    changed = schedules["changed"]
+    await set_override(hass, "sensor.kept", now, "manual", duration=60)
+    await set_override(hass, "sensor.changed", now, "manual", duration=60)
+    recomputes = kept.metrics.recomputes
+
+    await reload(
+        hass,
+        [
+            schedule("kept", "on"),
+            schedule("changed", "off"),
+            schedule("added", "on", start="9:00"),
+        ],
+        now,
+    )
+
+    # untouched sensors are not rebuilt, nor recomputed
+    assert schedules["kept"] is kept
+    assert kept.metrics.recomputes == recomputes
+    check_state(hass, "sensor.kept", "manual")
+
+    # the others are rebuilt, and keep their overrides
+    assert schedules["changed"] is not changed
+    assert len(schedules["changed"].overrides) == 1
+    check_state(hass, "sensor.changed", "manual")
+    check_state(hass, "sensor.added", "on")
+    assert "removed" not in schedules
+    # like any entity of the registry which is not provided anymore
+    assert hass.states.get("sensor.removed").state == STATE_UNAVAILABLE
+
+
+async def test_reload_is_over_once_sensors_are_added(hass: HomeAssistant):
+    now = make_testtime(10, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(hass, [schedule("kept", "on")])
+
+    added = []
+    hass.bus.async_listen(
+        EVENT_RELOADED, lambda event: added.append(hass.states.get("sensor.added"))
+    )
+    await reload(hass, [schedule("kept", "on"), schedule("added", "on")], now)
+    assert len(added) == 1 and added[0] is not None
+
+
+async def test_reload_without_sensors(hass: HomeAssistant):
+    assert await setup.async_setup_component(hass, DOMAIN, {})
+    assert await setup.async_setup_component(hass, SENSOR, {})
+    schedules = get_coordinator(hass).schedules
+    schedules["stale"] = None
+
+    # everything is set up again
+    await reload(hass, [schedule("added", "on")], make_testtime(10, 0))
+    assert set(schedules) == {"added"}
+    check_state(hass, "sensor.added", "on")
+
+
+def with_condition(config: dict, entity_id: str) -> dict:
+    condition = {"condition": "state", "entity_id": entity_id, "state": "on"}
+    for event in config["events"]:
+        event["condition"] = condition
+    return config
+
+
+async def test_reload_forgets_conditions_of_removed_sensors(hass: HomeAssistant):
+    now = make_testtime(10, 0)
+    hass.states.async_set("input_boolean.shared", "on")
+    hass.states.async_set("input_boolean.removed", "on")
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(
+            hass,
+            [
+                with_condition(schedule("kept", "on"), "input_boolean.shared"),
+                with_condition(schedule("shared", "on"), "input_boolean.shared"),
+                with_condition(schedule("removed", "on"), "input_boolean.removed"),
+            ],
+        )
+    conditions = get_coordinator(hass).conditions
+    assert len(conditions) == 2
+
+    await reload(
+        hass, [with_condition(schedule("kept", "on"), "input_boolean.shared")], now
+    )
+    # the condition that the kept sensor shared is still compiled
+    assert len(conditions) == 1
+    check_state(hass, "sensor.kept", "on")
+
+
+async def test_reload_forgets_templates_of_removed_sensors(hass: HomeAssistant):
+    now = make_testtime(10, 0)
+    hass.states.async_set("sensor.shared", "8:00")
+    hass.states.async_set("sensor.removed", "9:00")
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_multiple_sensors(
+            hass,
+            [
+                schedule("kept", "on", start="{{ states('sensor.shared') }}"),
+                schedule("shared", "on", start="{{ states('sensor.shared') }}"),
+                schedule("removed", "on", start="{{ states('sensor.removed') }}"),
+            ],
+        )
+    templates = get_coordinator(hass).templates
+    assert len(templates) == 2
+
+    await reload(
+        hass, [schedule("kept", "on", start="{{ states('sensor.shared') }}")], now
+    )
+    # the template that the kept sensor shared is still rendered
+    assert len(templates) == 1
+    check_state(hass, "sensor.kept", "on")
@@ -36,6 +36,15 @@ from custom_components.schedule_state.const import (
     CONF_START,
     DOMAIN,
 )
+from custom_components.schedule_state.layers import (
+    BLOCK_COLUMNS,
+    FLAG_DEFAULT_BG,
+    FLAG_DYNAMIC_COLOR,
+    FLAG_WRAPS_END,
+    FLAG_WRAPS_START,
+    LAYERS_FORMAT_COMPACT,
+)
+from custom_components.schedule_state.sensor import WAIT_FOR_ENTITIES
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -118,14 +127,63 @@ async def setup_test_multiple_sensors(
         check_schedule_state_sanity(config, sensor)
 
 
+def expand_layers(compact: dict[str, Any]) -> dict[str, list[dict]]:
+    """Decode the compact layers format back to the verbose layer structure"""
+    tables = compact["tables"]
+    columns = {
+        "state_value": "states",
+        "raw_state_template": "templates",
+        "raw_conditions": "conditions",
+        "condition_text": "condition_texts",
+        "icon": "icons",
+    }
+    blocks = []
+    for row in compact["blocks"]:
+        values = dict(zip(BLOCK_COLUMNS, row))
+        flags = values.pop("flags")
+        is_default = bool(flags & FLAG_DEFAULT_BG)
+        block = {} if is_default else {"event_idx": values["event_idx"]}
+        for key in ("start", "end", "original_start", "original_end"):
+            minutes = values[key]
+            block[key] = f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+        block["wraps_start"] = bool(flags & FLAG_WRAPS_START)
+        block["wraps_end"] = bool(flags & FLAG_WRAPS_END)
+        for key, table in columns.items():
+            if key != "icon" or not is_default:
+                block[key] = tables[table][values[key]]
+        block["is_default_bg"] = is_default
+        block["z_index"] = 1 if is_default else 2
+        block["is_dynamic_color"] = bool(flags & FLAG_DYNAMIC_COLOR)
+        blocks.append(block)
+
+    return {
+        day: [
+            {
+                "condition_key": condition_key,
+                "condition_text": tables["condition_texts"][text],
+                "blocks": [blocks[idx] for idx in indices],
+                "is_default_layer": condition_key == "default",
+            }
+            for condition_key, text, indices in layers
+        ]
+        for day, layers in compact["days"].items()
+    }
+
+
 def check_schedule_state_sanity(config, sensor):
     if config.get("platform") != "schedule_state":
         return
 
+    if not config.get("structure_attributes", True):
+        # see test_structure_attributes_disabled
+        return
+
     # check that all events were serialized (does not check correctness)
     assert len(config.get("events", [])) == len(sensor._attributes["events"])
 
     layers = sensor._attributes["layers"]
+    if sensor._attributes["layers_format"] == LAYERS_FORMAT_COMPACT:
+        layers = expand_layers(layers)
 
     # check that there is a layer for each day
     for day in WEEKDAYS:
@@ -139,6 +197,26 @@ async def test_blank_setup(hass: HomeAssistant) -> None:
     await setup_test_sensor(hass, {"platform": DOMAIN})
 
 
+async def test_structure_attributes_disabled(hass: HomeAssistant) -> None:
+    config = {
+        "platform": DOMAIN,
+        "name": "no structure",
+        "structure_attributes": False,
+        "events": [{"start": "8:00", "end": "17:00", "state": "work"}],
+    }
+    await setup_test_sensor(hass, config)
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+
+    # the layers and events are computed, but not published in the attributes
+    state = hass.states.get("sensor.no_structure")
+    for key in ("layers", "layers_format", "events"):
+        assert key not in state.attributes
+    assert state.attributes["structure_version"] == sensor.data.structure_version
+    assert state.attributes["total_events"] == sensor.data.total_events_count
+    assert len(sensor.data.events_list) == 1
+    assert all(day in sensor.data.layers_by_day for day in WEEKDAYS)
+
+
 def basic_test(
     configfile: str,
     overrides: dict = {},
@@ -784,6 +862,144 @@ async def test_schedule_modified_by_template_with_error(
     await check_state_at_time(hass, sensor, now, "off")
 
 
+async def test_schedule_waits_for_dependencies(hass: HomeAssistant):
+    """Events using entities that do not exist yet are not errors, and are retried once"""
+    now = make_testtime(10, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now) as p:
+        await setup_test_sensor(
+            hass,
+            {
+                "platform": DOMAIN,
+                "name": "waiting",
+                "events": [
+                    {
+                        "state": "on",
+                        "start": "{{ states('sensor.wakeup') }}",
+                        "end": "12:00",
+                    },
+                    {
+                        "state": "away",
+                        "start": "11:00",
+                        "condition": {
+                            "condition": "state",
+                            "entity_id": "binary_sensor.away",
+                            "state": "on",
+                        },
+                    },
+                ],
+            },
+        )
+        sensor = [e for e in hass.data["sensor"].entities][-1]
+        check_state(hass, "sensor.waiting", "default", p, now)
+
+        assert len(sensor._attributes["errors"]) == 0
+        # recomputed when the wait is over
+        assert sensor.data.force_refresh is not None
+        assert sensor.data.waiting_for == {"sensor.wakeup", "binary_sensor.away"}
+        recomputes = sensor.data.metrics.recomputes
+
+        # not available yet
+        hass.states.async_set("sensor.wakeup", "unavailable")
+        await hass.async_block_till_done()
+        assert sensor.data.metrics.recomputes == recomputes
+
+        # the schedule is recomputed once everything is available
+        hass.states.async_set("sensor.wakeup", "9:00")
+        await hass.async_block_till_done()
+        assert sensor.data.metrics.recomputes == recomputes
+
+        hass.states.async_set("binary_sensor.away", "off")
+        await hass.async_block_till_done()
+        assert sensor.data.metrics.recomputes == recomputes + 1
+        assert sensor.data.waiting_for == set()
+        check_state(hass, "sensor.waiting", "on", p, now)
+
+
+async def test_schedule_stops_waiting_for_missing_entities(
+    hass: HomeAssistant, caplog: pytest.LogCaptureFixture
+):
+    """Entities that never become available end up being reported as errors"""
+    now = make_testtime(10, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now) as p:
+        await setup_test_sensor(
+            hass,
+            {
+                "platform": DOMAIN,
+                "name": "typo",
+                "events": [
+                    {
+                        "state": "on",
+                        "start": "{{ states('sensor.typo_entity') }}",
+                        "end": "12:00",
+                    },
+                ],
+            },
+        )
+        sensor = [e for e in hass.data["sensor"].entities][-1]
+        check_state(hass, "sensor.typo", "default", p, now)
+        assert len(sensor._attributes["errors"]) == 0
+        assert sensor.data.waiting_for == {"sensor.typo_entity"}
+        assert not [r for r in caplog.records if r.levelno == logging.ERROR]
+
+    # still waiting
+    await recalculate(hass, "sensor.typo", now + WAIT_FOR_ENTITIES / 2)
+    assert len(sensor._attributes["errors"]) == 0
+
+    # the wait is over
+    await recalculate(hass, "sensor.typo", now + WAIT_FOR_ENTITIES)
+    assert len(sensor._attributes["errors"]) == 1
+    assert sensor.data.waiting_for == set()
+    assert sensor.data.force_refresh is not None
+    assert sensor._attr_icon == sensor.data.error_icon
+    assert any(
+        r.levelno == logging.ERROR and "sensor.typo_entity" in r.getMessage()
+        for r in caplog.records
+    )
+
+
+async def test_schedule_tracks_current_dependencies(hass: HomeAssistant):
+    """Only the entities used by the last recompute trigger recomputes"""
+    now = make_testtime(10, 0)
+    hass.states.async_set("input_boolean.late", "off")
+    hass.states.async_set("sensor.early", "8:00")
+    hass.states.async_set("sensor.late", "11:00")
+    with patch(TIME_FUNCTION_PATH, return_value=now) as p:
+        await setup_test_sensor(
+            hass,
+            {
+                "platform": DOMAIN,
+                "name": "branches",
+                "events": [
+                    {
+                        "state": "on",
+                        "start": "{{ states('sensor.late') if is_state('input_boolean.late', 'on') else states('sensor.early') }}",
+                        "end": "12:00",
+                    },
+                ],
+            },
+        )
+        sensor = [e for e in hass.data["sensor"].entities][-1]
+        dispatcher = sensor.data.coordinator.dispatcher
+        check_state(hass, "sensor.branches", "on", p, now)
+        assert dispatcher.entities(sensor) == {"input_boolean.late", "sensor.early"}
+
+        # the other branch of the template is used: its entity is tracked instead
+        hass.states.async_set("input_boolean.late", "on")
+        await hass.async_block_till_done()
+        check_state(hass, "sensor.branches", "default", p, now)
+        assert dispatcher.entities(sensor) == {"input_boolean.late", "sensor.late"}
+
+        recomputes = sensor.data.metrics.recomputes
+        hass.states.async_set("sensor.early", "9:00")
+        await hass.async_block_till_done()
+        assert sensor.data.metrics.recomputes == recomputes
+
+        hass.states.async_set("sensor.late", "9:30")
+        await hass.async_block_till_done()
+        assert sensor.data.metrics.recomputes == recomputes + 1
+        check_state(hass, "sensor.branches", "on", p, now)
+
+
 WORKDAY_SENSOR_CONFIG = {
     "name": workday_const.DEFAULT_NAME,
     "country": "CA",
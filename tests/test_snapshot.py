@@ -0,0 +1,145 @@
+"""Tests the warm-start snapshots of schedule_state sensors."""
+
+from datetime import timedelta
+from typing import Any
+from unittest.mock import patch
+
+from homeassistant import setup
+from homeassistant.components.sensor import DOMAIN as SENSOR
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import CoreState, HomeAssistant
+from homeassistant.util import dt
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.sensor import PLATFORM_SCHEMA, schedule_sensors
+from custom_components.schedule_state.snapshot import (
+    SAVE_DELAY,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    config_fingerprint,
+)
+
+from .test_schedule import TIME_FUNCTION_PATH, check_state, make_testtime
+
+CONFIG = {
+    "platform": DOMAIN,
+    "name": "snap",
+    "events": [{"start": "8:00", "end": "17:00", "state": "work"}],
+}
+
+
+def saved_snapshot(now, **kwargs) -> dict[str, Any]:
+    """A snapshot of CONFIG where the state during the day is "remembered" """
+    return {
+        "fingerprint": config_fingerprint(PLATFORM_SCHEMA(CONFIG)),
+        "default_state": "default",
+        "default_icon": "mdi:calendar-check",
+        "error_icon": "mdi:calendar-alert",
+        "known_states": ["default", "remembered"],
+        "error_states": [],
+        "entities": [],
+        "attr_keys": [],
+        "day": now.date().isoformat(),
+        "bounds": [0, 8 * 60, 17 * 60],
+        "values": [
+            ["default", "mdi:calendar-check", {}],
+            ["remembered", "mdi:calendar-check", {}],
+            ["default", "mdi:calendar-check", {}],
+        ],
+        **kwargs,
+    }
+
+
+async def setup_at_boot(hass: HomeAssistant, now) -> None:
+    """Set up the sensor while Home Assistant is starting"""
+    hass.set_state(CoreState.not_running)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        assert await setup.async_setup_component(hass, DOMAIN, {})
+        assert await setup.async_setup_component(hass, SENSOR, {SENSOR: [CONFIG]})
+        await hass.async_block_till_done()
+
+
+async def start(hass: HomeAssistant, now) -> None:
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        hass.set_state(CoreState.running)
+        hass.bus.async_fire(EVENT_HOMEASSISTANT_STARTED)
+        await hass.async_block_till_done()
+
+
+async def test_snapshot_saved(hass: HomeAssistant, hass_storage: dict[str, Any]):
+    now = make_testtime(10, 0)
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        assert await setup.async_setup_component(hass, DOMAIN, {})
+        assert await setup.async_setup_component(hass, SENSOR, {SENSOR: [CONFIG]})
+        await hass.async_block_till_done()
+    check_state(hass, "sensor.snap", "work")
+
+    # saving is delayed
+    assert STORAGE_KEY not in hass_storage
+    async_fire_time_changed(hass, dt.utcnow() + timedelta(seconds=SAVE_DELAY + 1))
+    await hass.async_block_till_done()
+
+    snapshot = hass_storage[STORAGE_KEY]["data"]["snap"]
+    assert snapshot["fingerprint"] == config_fingerprint(PLATFORM_SCHEMA(CONFIG))
+    assert snapshot["bounds"] == [0, 8 * 60, 17 * 60]
+    assert [v[0] for v in snapshot["values"]] == ["default", "work", "default"]
+
+
+async def test_warm_start(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    caplog: pytest.LogCaptureFixture,
+):
+    now = make_testtime(10, 0)
+    hass_storage[STORAGE_KEY] = {
+        "version": STORAGE_VERSION,
+        "key": STORAGE_KEY,
+        "data": {"snap": saved_snapshot(now)},
+    }
+
+    await setup_at_boot(hass, now)
+    data = schedule_sensors(hass)[0].data
+
+    # the state is served from the snapshot, without evaluating the events
+    check_state(hass, "sensor.snap", "remembered")
+    assert data.warm
+    assert data.metrics.recomputes == 0
+
+    # and recomputed once Home Assistant has started
+    await start(hass, now)
+    check_state(hass, "sensor.snap", "work")
+    assert not data.warm
+    assert data.metrics.recomputes == 1
+
+    # the startup listener is gone
+    await schedule_sensors(hass)[0].async_remove()
+    await hass.async_block_till_done()
+    assert "Unable to remove unknown job listener" not in caplog.text
+
+
+async def test_stale_snapshot(hass: HomeAssistant, hass_storage: dict[str, Any]):
+    now = make_testtime(10, 0)
+    yesterday = now - timedelta(days=1)
+    hass_storage[STORAGE_KEY] = {
+        "version": STORAGE_VERSION,
+        "key": STORAGE_KEY,
+        "data": {"snap": saved_snapshot(yesterday)},
+    }
+
+    # a snapshot of another day is not used
+    await setup_at_boot(hass, now)
+    check_state(hass, "sensor.snap", "work")
+    assert not schedule_sensors(hass)[0].data.warm
+
+    # neither is the snapshot of another configuration
+    hass_storage[STORAGE_KEY]["data"]["snap"] = saved_snapshot(now, fingerprint="x")
+    data = schedule_sensors(hass)[0].data
+    assert not data.restore_snapshot(hass_storage[STORAGE_KEY]["data"]["snap"])
+
+    # an invalid snapshot does not change anything
+    invalid = saved_snapshot(now, default_state="invalid")
+    del invalid["known_states"]
+    assert not data.restore_snapshot(invalid)
+    assert data.default_state == "default"
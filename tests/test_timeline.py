@@ -0,0 +1,237 @@
+"""Tests the compiled timeline of schedule_state sensors."""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.const import WEEKDAYS
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.util import dt
+import pytest
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.timeline import MONTHS, month_numbers
+
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    check_state,
+    make_testtime,
+    setup_test_sensor,
+)
+
+
+def make_weekday_config(name, weekday):
+    return {
+        "platform": DOMAIN,
+        "name": name,
+        "events": [
+            {
+                "start": "8:00",
+                "end": "17:00",
+                "state": "work",
+                "icon": "mdi:briefcase",
+                "condition": [{"condition": "time", "weekday": [weekday]}],
+            },
+            {"start": "22:00", "end": "23:00", "state": "sleep"},
+        ],
+    }
+
+
+async def test_forecast(hass: HomeAssistant):
+    now = make_testtime(9, 0)
+    weekday = WEEKDAYS[now.weekday()]
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, make_weekday_config("forecast", weekday))
+
+        response = await hass.services.async_call(
+            DOMAIN,
+            "get_forecast",
+            {"hours": 48},
+            target={"entity_id": "sensor.forecast"},
+            blocking=True,
+            return_response=True,
+        )
+
+    forecast = response["sensor.forecast"]
+    assert forecast["current"]["state"] == "work"
+    assert forecast["current"]["icon"] == "mdi:briefcase"
+
+    transitions = [(t["time"][:16], t["state"]) for t in forecast["transitions"]]
+    today = now.date().isoformat()
+    tomorrow = (now + timedelta(days=1)).date().isoformat()
+    # the weekday condition is only satisfied today
+    assert transitions == [
+        (f"{today}T17:00", "default"),
+        (f"{today}T22:00", "sleep"),
+        (f"{today}T23:00", "default"),
+        (f"{tomorrow}T22:00", "sleep"),
+        (f"{tomorrow}T23:00", "default"),
+    ]
+
+    # computing the forecast did not change the sensor
+    check_state(hass, "sensor.forecast", "work")
+
+
+async def test_forecast_months(hass: HomeAssistant):
+    # the last day of a month
+    now = make_testtime(9, 0)
+    now = (now.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    tomorrow = now + timedelta(days=1)
+    config = {
+        "platform": DOMAIN,
+        "name": "months",
+        "events": [
+            {"start": "8:00", "end": "17:00", "state": "work", "months": [now.month]},
+            {
+                "start": "10:00",
+                "end": "12:00",
+                "state": "holiday",
+                "months": [MONTHS[tomorrow.month - 1]],
+            },
+        ],
+    }
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, config)
+        check_state(hass, "sensor.months", "work")
+
+        response = await hass.services.async_call(
+            DOMAIN,
+            "get_forecast",
+            {"hours": 48},
+            target={"entity_id": "sensor.months"},
+            blocking=True,
+            return_response=True,
+        )
+
+    # the current day follows the sensor, the following days only include the events
+    # of their months
+    tomorrow = tomorrow.date().isoformat()
+    transitions = [
+        (t["time"][:16], t["state"])
+        for t in response["sensor.months"]["transitions"]
+        if t["time"].startswith(tomorrow)
+    ]
+    assert transitions == [
+        (f"{tomorrow}T10:00", "holiday"),
+        (f"{tomorrow}T12:00", "default"),
+    ]
+
+
+def test_month_numbers(caplog: pytest.LogCaptureFixture):
+    assert month_numbers(None) is None
+    assert month_numbers(["Jun", 7, "8"]) == {6, 7, 8}
+    assert month_numbers("december") == {12}
+    # an event with a typo in its months is not left out of every day
+    assert month_numbers(["jun", "juin"]) is None
+    assert "Invalid month 'juin'" in caplog.text
+
+
+async def test_forecast_next_week(hass: HomeAssistant):
+    now = make_testtime(9, 0)
+    weekday = WEEKDAYS[(now.weekday() + 1) % 7]
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, make_weekday_config("next week", weekday))
+        check_state(hass, "sensor.next_week", "default")
+
+    sensor = [e for e in hass.data["sensor"].entities][-1]
+    timeline = await sensor.data.async_get_timeline()
+    for days in (1, 8):
+        when = dt.as_local(now.replace(hour=12)) + timedelta(days=days)
+        assert timeline.value_at(when).state == "work"
+        assert timeline.value_at(when.replace(hour=7)).state == "default"
+    # the timeline is compiled once, and each day is cached
+    assert await sensor.data.async_get_timeline() is timeline
+    assert len(timeline._days) == 2
+
+
+async def test_states_at(hass: HomeAssistant):
+    now = make_testtime(0, 0)
+    weekday = WEEKDAYS[now.weekday()]
+    config = make_weekday_config("states at", weekday)
+    config["extra_attributes"] = {"setpoint": 18}
+    config["events"][0]["setpoint"] = 21
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, config)
+
+        response = await hass.services.async_call(
+            DOMAIN,
+            "get_states_at",
+            {"end": now + timedelta(days=2), "step": 60},
+            target={"entity_id": "sensor.states_at"},
+            blocking=True,
+            return_response=True,
+        )
+
+    result = response["sensor.states_at"]
+    assert len(result["times"]) == 49
+    states = result["states"]
+    assert states[:8] == ["default"] * 8
+    assert states[8:17] == ["work"] * 9
+    assert states[22] == "sleep"
+    # no work tomorrow
+    assert states[24 + 8 : 24 + 17] == ["default"] * 9
+    assert states[24 + 22] == "sleep"
+    assert result["attributes"]["setpoint"][12] == "21"
+    assert result["attributes"]["setpoint"][24 + 12] == "18"
+
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        response = await hass.services.async_call(
+            DOMAIN,
+            "get_states_at",
+            {"times": [now.replace(hour=7, minute=59), now.replace(hour=8)]},
+            target={"entity_id": "sensor.states_at"},
+            blocking=True,
+            return_response=True,
+        )
+    assert response["sensor.states_at"]["states"] == ["default", "work"]
+
+    with pytest.raises(ServiceValidationError):
+        await hass.services.async_call(
+            DOMAIN,
+            "get_states_at",
+            {"end": now + timedelta(days=365), "step": 1},
+            target={"entity_id": "sensor.states_at"},
+            blocking=True,
+            return_response=True,
+        )
+
+
+# the calendar entity sets timers for the start/end of its current event
+@pytest.mark.parametrize("expected_lingering_timers", [True])
+async def test_calendar(hass: HomeAssistant):
+    now = dt.as_local(make_testtime(9, 0))
+    weekday = WEEKDAYS[now.weekday()]
+    config = make_weekday_config("calendar", weekday)
+    config["calendar"] = True
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, config)
+        await hass.async_block_till_done()
+
+        state = hass.states.get("calendar.calendar")
+        assert state is not None
+        assert state.state == "on"
+        assert state.attributes["message"] == "work"
+
+        response = await hass.services.async_call(
+            "calendar",
+            "get_events",
+            {
+                "start_date_time": now,
+                "end_date_time": now + timedelta(days=2),
+            },
+            target={"entity_id": "calendar.calendar"},
+            blocking=True,
+            return_response=True,
+        )
+
+    events = [
+        (e["start"][:16], e["end"][:16], e["summary"])
+        for e in response["calendar.calendar"]["events"]
+    ]
+    today = now.date().isoformat()
+    tomorrow = (now + timedelta(days=1)).date().isoformat()
+    assert events == [
+        (f"{today}T08:00", f"{today}T17:00", "work"),
+        (f"{today}T22:00", f"{today}T23:00", "sleep"),
+        (f"{tomorrow}T22:00", f"{tomorrow}T23:00", "sleep"),
+    ]
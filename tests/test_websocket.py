@@ -0,0 +1,224 @@
+"""Tests the websocket commands of schedule_state."""
+
+from unittest.mock import MagicMock, patch
+
+from homeassistant import setup
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.json import json_dumps
+
+from custom_components.schedule_state.const import DOMAIN
+from custom_components.schedule_state.layers import (
+    FLAG_WRAPS_END,
+    LAYERS_FORMAT_COMPACT,
+)
+from custom_components.schedule_state.sensor import schedule_sensors
+from custom_components.schedule_state.websocket_api import ws_subscribe
+
+from .test_reload import reload
+from .test_schedule import (
+    TIME_FUNCTION_PATH,
+    expand_layers,
+    make_testtime,
+    setup_test_sensor,
+)
+
+
+def make_connection():
+    connection = MagicMock()
+    connection.subscriptions = {}
+    return connection
+
+
+async def test_subscribe(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "structure",
+            "structure_attributes": False,
+            "events": [
+                {"start": "8:00", "end": "17:00", "state": "work"},
+                {
+                    "start": "{{ '9:00' if is_state('input_boolean.vacation', 'on') else '10:00' }}",
+                    "end": "12:00",
+                    "state": "away",
+                },
+            ],
+        },
+    )
+
+    # the large attributes are not in the state
+    state = hass.states.get("sensor.structure")
+    assert "layers" not in state.attributes
+    assert "events" not in state.attributes
+    version = state.attributes["structure_version"]
+
+    connection = make_connection()
+    ws_subscribe(
+        hass,
+        connection,
+        {"id": 1, "type": "schedule_state/subscribe", "entity_id": "sensor.structure"},
+    )
+    connection.send_result.assert_called_once_with(1)
+    assert connection.send_event.call_count == 1
+    structure = connection.send_event.call_args[0][1]
+    assert structure["version"] == version
+    assert structure["layers"]["mon"][0]["blocks"][0]["start"] == "08:00"
+
+    # recalculating without changes does not send anything
+    await hass.services.async_call(
+        DOMAIN, "recalculate", target={"entity_id": "sensor.structure"}, blocking=True
+    )
+    assert connection.send_event.call_count == 1
+
+    hass.states.async_set("input_boolean.vacation", "on")
+    await hass.async_block_till_done()
+
+    assert connection.send_event.call_count == 2
+    structure = connection.send_event.call_args[0][1]
+    assert structure["version"] == version + 1
+    blocks = [b for layer in structure["layers"]["mon"] for b in layer["blocks"]]
+    assert {"09:00"} == {b["start"] for b in blocks if b["state_value"] == "away"}
+
+    # unsubscribing stops the updates
+    connection.subscriptions.pop(1)()
+    hass.states.async_set("input_boolean.vacation", "off")
+    await hass.async_block_till_done()
+    assert connection.send_event.call_count == 2
+
+
+async def test_subscribe_up_to_date(hass: HomeAssistant):
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "structure",
+            "events": [{"start": "8:00", "end": "17:00", "state": "work"}],
+        },
+    )
+    state = hass.states.get("sensor.structure")
+    assert "layers" in state.attributes
+
+    # a client that already has the current version only gets the result
+    connection = make_connection()
+    ws_subscribe(
+        hass,
+        connection,
+        {
+            "id": 1,
+            "type": "schedule_state/subscribe",
+            "entity_id": "sensor.structure",
+            "version": state.attributes["structure_version"],
+        },
+    )
+    connection.send_result.assert_called_once_with(1)
+    connection.send_event.assert_not_called()
+
+    connection = make_connection()
+    ws_subscribe(
+        hass,
+        connection,
+        {"id": 2, "type": "schedule_state/subscribe", "entity_id": "sensor.nope"},
+    )
+    connection.send_error.assert_called_once()
+    assert connection.subscriptions == {}
+
+
+async def test_subscribe_across_reloads(hass: HomeAssistant):
+    now = make_testtime(9, 0)
+    config = {
+        "platform": DOMAIN,
+        "name": "reloaded",
+        "events": [{"start": "8:00", "end": "17:00", "state": "work"}],
+    }
+    with patch(TIME_FUNCTION_PATH, return_value=now):
+        await setup_test_sensor(hass, config)
+
+    connection = make_connection()
+    ws_subscribe(
+        hass,
+        connection,
+        {"id": 1, "type": "schedule_state/subscribe", "entity_id": "sensor.reloaded"},
+    )
+    assert connection.send_event.call_count == 1
+
+    # the structure of the rebuilt sensor is sent
+    config["events"][0]["state"] = "home"
+    await reload(hass, [config], now)
+    structure = connection.send_event.call_args[0][1]
+    blocks = [b for layer in structure["layers"]["mon"] for b in layer["blocks"]]
+    assert "home" in {b["state_value"] for b in blocks}
+
+    # and the subscription ends when the sensor is removed
+    await reload(hass, [], now)
+    connection.send_error.assert_called_once()
+    assert connection.subscriptions == {}
+
+
+async def test_compact_layers(hass: HomeAssistant):
+    await setup.async_setup_component(
+        hass, "input_boolean", {"input_boolean": {"vacation": {}}}
+    )
+    events = [
+        {
+            "start": f"{h}:00",
+            "end": f"{h}:30",
+            "state": f"state{h % 4}",
+            "icon": "mdi:home",
+            "condition": [
+                {
+                    "condition": "state",
+                    "entity_id": "input_boolean.vacation",
+                    "state": "off",
+                }
+            ],
+        }
+        for h in range(1, 23)
+    ]
+    events.append(
+        {"start": "22:00", "end": "2:00", "state": "night", "allow_wrap": True}
+    )
+    await setup_test_sensor(
+        hass,
+        {
+            "platform": DOMAIN,
+            "name": "compact",
+            "layers_format": LAYERS_FORMAT_COMPACT,
+            "events": events,
+        },
+    )
+
+    sensor = next(s for s in schedule_sensors(hass) if s.entity_id == "sensor.compact")
+    state = hass.states.get("sensor.compact")
+    assert state.attributes["layers_format"] == LAYERS_FORMAT_COMPACT
+    compact = state.attributes["layers"]
+    assert compact["format"] == LAYERS_FORMAT_COMPACT
+
+    # the compact format holds the same information, in a fraction of the size
+    verbose = sensor.data.layers_by_day
+    assert expand_layers(compact) == verbose
+    assert len(json_dumps(compact)) * 5 < len(json_dumps(verbose))
+
+    # each block is stored once, although it appears on every day
+    assert len(compact["blocks"]) == len(events) + 1 + 1  # wrapped event, default
+    assert compact["tables"]["icons"] == ["mdi:home", "mdi:calendar-check", None]
+    # minutes since midnight, the end of the day is 1440
+    assert compact["blocks"][-2][1:6] == [22 * 60, 1440, 22 * 60, 120, FLAG_WRAPS_END]
+
+    connection = make_connection()
+    ws_subscribe(
+        hass,
+        connection,
+        {
+            "id": 1,
+            "type": "schedule_state/subscribe",
+            "entity_id": "sensor.compact",
+            "layers_format": LAYERS_FORMAT_COMPACT,
+        },
+    )
+    structure = connection.send_event.call_args[0][1]
+    assert structure["layers_format"] == LAYERS_FORMAT_COMPACT
+    assert structure["layers"] is compact